@@ -0,0 +1,50 @@
+# address_detector.py
+import re
+
+
+# Street-type tokens, English and Québec French
+STREET_TYPES = (
+    "st", "street", "ave", "av", "avenue", "rd", "road", "blvd", "boul",
+    "boulevard", "dr", "drive", "ln", "lane", "way", "ct", "court", "pl",
+    "place", "hwy", "highway", "pkwy", "parkway", "cres", "crescent", "ter",
+    "terr", "terrace", "cir", "circle", "sq", "square", "rue", "chemin", "ch",
+    "route", "rang", "côte", "cote", "montée", "montee", "allée", "allee",
+)
+# Types written before the street name ("rue Saint-Denis"); short English
+# abbreviations are left out so "5 pl of waste" is not an address
+FRENCH_STREET_TYPES = (
+    "rue", "chemin", "ch", "boul", "boulevard", "avenue", "av", "route", "rang",
+    "côte", "cote", "montée", "montee", "allée", "allee", "place",
+)
+_STREET_TYPE = "|".join(sorted(STREET_TYPES, key=len, reverse=True))
+_FRENCH_STREET_TYPE = "|".join(sorted(FRENCH_STREET_TYPES, key=len, reverse=True))
+
+# "123 Main St", "1200 W. Peachtree Street": at least one name word, so
+# bare "<number> <street type>" fragments ("2 st", "15 Way") are rejected
+STREET_NUMBER_RE = re.compile(
+    rf"\b\d{{1,6}}[a-z]?,?\s+(?:[\w'.-]+\s+){{1,4}}?(?:{_STREET_TYPE})\b\.?",
+    re.IGNORECASE,
+)
+# "456 Rue Example", "12, rue Saint-Denis", "1200 boul. René-Lévesque"
+STREET_NUMBER_FR_RE = re.compile(
+    rf"\b\d{{1,6}}[a-z]?,?\s+(?:{_FRENCH_STREET_TYPE})\.?\s+[\w'-]+",
+    re.IGNORECASE,
+)
+# "CA 94105", "NY 10001-1234": state code required to skip years and amounts
+US_ZIP_RE = re.compile(r"\b[A-Z]{2},?\s+\d{5}(?:-\d{4})?\b")
+# "H2X 1Y4", "h2x1y4": letters D, F, I, O, Q, U are never used
+CA_POSTAL_RE = re.compile(
+    r"\b[ABCEGHJ-NPRSTVXY]\d[ABCEGHJ-NPRSTV-Z][ -]?\d[ABCEGHJ-NPRSTV-Z]\d\b",
+    re.IGNORECASE,
+)
+
+PATTERNS = (STREET_NUMBER_RE, STREET_NUMBER_FR_RE, US_ZIP_RE, CA_POSTAL_RE)
+
+
+def looks_like_address(text: str) -> bool:
+    """
+    Cheap local pre-filter: True when `text` may contain a street address
+    (street number + street type, US state + ZIP, or Canadian postal code).
+    Tuned for recall; the LLM extraction still decides what the addresses are.
+    """
+    return any(p.search(text) for p in PATTERNS)
@@ -0,0 +1,189 @@
+# answer_cache.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DEFAULT_TTL            = 24 * 3600  # seconds; data changes invalidate earlier
+DEFAULT_MAX_ENTRIES    = 500
+DEFAULT_SIMILARITY     = 0.95       # cosine similarity of a "same question"
+DEFAULT_CHECK_INTERVAL = 30         # seconds between two source-table checks
+
+SOURCE_TABLES = ("sales_metrics", "sales_conversations")
+EMBED_MODEL   = "snowflake-arctic-embed-m-v1.5"
+
+# (text, sql, citations) as returned by process_sse_response()
+Answer = Tuple[str, str, List[dict]]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Cache key of a question: unicode-normalized, casefolded, punctuation
+    and whitespace collapsed, so "Total deal value by rep?" and
+    "total deal value by rep" share one entry.
+    """
+    key = unicodedata.normalize("NFKC", prompt).casefold()
+    key = re.sub(r"[^\w\s]+", " ", key)
+    return re.sub(r"\s+", " ", key).strip()
+
+
+def snowflake_data_version(session, tables: Sequence[str] = SOURCE_TABLES) -> Callable[[], Tuple]:
+    """
+    Version of the source tables from their change tracking: the last
+    commit time of each, in one cheap metadata query.
+    """
+    columns = ", ".join(f"SYSTEM$LAST_CHANGE_COMMIT_TIME('{t}')" for t in tables)
+
+    def version() -> Tuple:
+        return tuple(session.sql(f"SELECT {columns}").collect()[0])
+    return version
+
+
+def snowflake_embedder(session, model: str = EMBED_MODEL) -> Callable[[str], np.ndarray]:
+    """Embed a prompt with Cortex EMBED_TEXT_768."""
+    def embed(text: str) -> np.ndarray:
+        row = session.sql(
+            "SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, ?)::ARRAY", params=[model, text]
+        ).collect()[0]
+        vector = row[0]
+        if isinstance(vector, str):
+            vector = vector.strip("[]").split(",")
+        return np.asarray(vector, dtype=np.float32)
+    return embed
+
+
+class AnswerCache:
+    """
+    In-process LRU of agent answers keyed by normalized prompt. With an
+    `embed` function, a miss falls back to the closest cached question when
+    its cosine similarity reaches `similarity`. Every entry is dropped when
+    `data_version()` changes (checked at most every `check_interval` s).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        data_version: Optional[Callable[[], Hashable]] = None,
+        embed: Optional[Callable[[str], np.ndarray]] = None,
+        similarity: float = DEFAULT_SIMILARITY,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+    ):
+        self.max_entries    = max_entries
+        self.ttl            = ttl
+        self.data_version   = data_version
+        self.embed          = embed
+        self.similarity     = similarity
+        self.check_interval = check_interval
+        self.hits = self.similar_hits = self.misses = self.invalidations = 0
+        self._version: Hashable = None
+        self._checked = 0.0
+        # embedding of the last missed prompt, reused when its answer is set
+        self._last_vector: Tuple[str, Optional[np.ndarray]] = ("", None)
+        # key -> (answer, expires_at, unit embedding or None)
+        self._entries: "OrderedDict[str, Tuple[Answer, float, Optional[np.ndarray]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, prompt: str) -> Optional[Answer]:
+        """Cached answer for `prompt` or a close enough question, else None."""
+        self._check_version()
+        key = normalize_prompt(prompt)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if self.embed is None or not self._entries:
+                self.misses += 1
+                return None
+
+        vector = self._unit(self.embed(prompt))
+        match = self._closest(vector, now)
+        with self._lock:
+            self._last_vector = (key, vector)
+            if match is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.similar_hits += 1
+            return match
+
+    def set(self, prompt: str, answer: Answer) -> None:
+        self._check_version()
+        key = normalize_prompt(prompt)
+        vector = None
+        if self.embed is not None:
+            with self._lock:
+                last_key, vector = self._last_vector
+            if last_key != key or vector is None:
+                vector = self._unit(self.embed(prompt))
+        with self._lock:
+            self._entries[key] = (answer, time.time() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries":       len(self._entries),
+                "hits":          self.hits,
+                "similar_hits":  self.similar_hits,
+                "misses":        self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    def _check_version(self) -> None:
+        if self.data_version is None:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return
+            self._checked = now
+        try:
+            version = self.data_version()
+        except Exception:
+            return
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._entries.clear()
+                    self.invalidations += 1
+                self._version = version
+
+    def _closest(self, vector: np.ndarray, now: float) -> Optional[Answer]:
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry[2] is not None and entry[1] > now
+            ]
+            if not candidates:
+                return None
+            scores = np.stack([entry[2] for _, entry in candidates]) @ vector
+            best = int(scores.argmax())
+            if scores[best] < self.similarity:
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
@@ -0,0 +1,56 @@
+# benchmarks/bench_flexpolyline.py
+"""
+Compare the pure python flexpolyline encoder/decoder with the vectorized ones.
+
+    python -m benchmarks.bench_flexpolyline
+"""
+import random
+import timeit
+
+import numpy as np
+
+from flexpolyline import encode, encode_array, iter_decode, decode_array, decode_many
+
+
+def synthetic_route(n_points: int, seed: int = 0) -> list[tuple[float, float]]:
+    """Random walk around Montréal, close to what HERE returns for a road route."""
+    rng = random.Random(seed)
+    lat, lng = 45.5017, -73.5673
+    coords = []
+    for _ in range(n_points):
+        lat += rng.uniform(-0.001, 0.001)
+        lng += rng.uniform(-0.001, 0.001)
+        coords.append((lat, lng))
+    return coords
+
+
+def bench(n_points: int, repeat: int = 5) -> None:
+    route = synthetic_route(n_points)
+    route_array = np.array(route)
+    encoded = encode(route)
+    assert encode_array(route_array) == encoded
+
+    reference = np.array(list(iter_decode(encoded)))
+    assert np.array_equal(decode_array(encoded), reference)
+
+    number = max(1, 100_000 // n_points)
+    t_iter = min(timeit.repeat(lambda: list(iter_decode(encoded)), number=number, repeat=repeat)) / number
+    t_array = min(timeit.repeat(lambda: decode_array(encoded), number=number, repeat=repeat)) / number
+    batch = [encoded] * 10
+    t_many = min(timeit.repeat(lambda: decode_many(batch), number=number, repeat=repeat)) / number / 10
+
+    t_encode = min(timeit.repeat(lambda: encode(route), number=number, repeat=repeat)) / number
+    t_encode_array = min(timeit.repeat(lambda: encode_array(route_array), number=number, repeat=repeat)) / number
+
+    print(
+        f"{n_points:>9,} pts | encode {t_encode * 1e3:9.3f} ms"
+        f" | encode_array {t_encode_array * 1e3:8.3f} ms ({t_encode / t_encode_array:5.1f}x)"
+        f" | iter_decode {t_iter * 1e3:9.3f} ms"
+        f" | decode_array {t_array * 1e3:8.3f} ms ({t_iter / t_array:5.1f}x)"
+        f" | decode_many {t_many * 1e3:8.3f} ms/route"
+    )
+
+
+if __name__ == "__main__":
+    for n in (10, 1_000, 10_000, 100_000):
+        bench(n)
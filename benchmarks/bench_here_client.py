@@ -0,0 +1,65 @@
+# benchmarks/bench_here_client.py
+"""
+Sequential vs concurrent geocoding against a local stub of the HERE API.
+
+    python -m benchmarks.bench_here_client
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from here_client import HereClient
+
+LATENCY = 0.2  # seconds, roughly one HERE round trip
+
+
+class StubHereHandler(BaseHTTPRequestHandler):
+    """Answers /v1/geocode and /v8/routes after LATENCY seconds."""
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/v1/geocode":
+            body = {"items": [{"title": query["q"][0], "position": {"lat": 45.5, "lng": -73.56}}]}
+        else:
+            # one section per leg, like HERE with via waypoints
+            sections = [{"polyline": "BFoz5xJ67i1B1B7PzIhaxL7Y"}] * (len(query.get("via", [])) + 1)
+            body = {"routes": [{"sections": sections}]}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHereHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    client = HereClient("stub", geocode_base_url=base_url, router_base_url=base_url)
+    addresses = [f"{n} Rue Example Montréal QC" for n in range(2)]
+
+    start = time.perf_counter()
+    for addr in addresses:
+        client.geocode(addr)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.geocode_many([a + " 2" for a in addresses])
+    concurrent = time.perf_counter() - start
+
+    print(f"2 addresses | sequential {sequential * 1e3:7.1f} ms | geocode_many {concurrent * 1e3:7.1f} ms")
+    client.close()
+    server.shutdown()
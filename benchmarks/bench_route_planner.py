@@ -0,0 +1,28 @@
+# benchmarks/bench_route_planner.py
+"""
+Local compute of the multi-stop planner (haversine matrix, nearest neighbour
++ 2-opt) for growing numbers of stops.
+
+    python -m benchmarks.bench_route_planner
+"""
+import timeit
+
+import numpy as np
+
+from route_planner import estimate_travel_times, nearest_neighbour, plan_order, tour_cost
+
+
+def random_stops(n: int, seed: int = 0) -> np.ndarray:
+    """Stops scattered over greater Montréal."""
+    rng = np.random.default_rng(seed)
+    return np.c_[45.5 + rng.uniform(-0.3, 0.3, n), -73.6 + rng.uniform(-0.4, 0.4, n)]
+
+
+if __name__ == "__main__":
+    for n in (10, 100, 250, 500):
+        stops = random_stops(n)
+        matrix = estimate_travel_times(stops)
+        greedy = tour_cost(nearest_neighbour(matrix), matrix)
+        order, cost = plan_order(stops)
+        seconds = min(timeit.repeat(lambda: plan_order(stops), number=3, repeat=3)) / 3
+        print(f"{n:>4} stops | {seconds * 1e3:8.1f} ms | 2-opt gain over greedy {1 - cost / greedy:6.1%}")
@@ -0,0 +1,55 @@
+# benchmarks/bench_spatial_index.py
+"""
+Site index build and query latency for growing numbers of geocoded sites,
+and bulk nearest-depot assignment.
+
+    python -m benchmarks.bench_spatial_index
+"""
+import itertools
+import os
+import tempfile
+import timeit
+
+import numpy as np
+
+from spatial_index import SpatialIndex
+
+
+def random_sites(n: int, seed: int = 0) -> np.ndarray:
+    """Sites scattered over California, where the sample requests are."""
+    rng = np.random.default_rng(seed)
+    return np.c_[rng.uniform(32.5, 42.0, n), rng.uniform(-124.0, -114.5, n)]
+
+
+def per_call_us(fn, number: int = 200) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+if __name__ == "__main__":
+    depots = SpatialIndex()
+    depots.insert_many(["LAX", "SAN", "SFO", "SMF", "FAT"], [
+        (34.0522, -118.2437), (32.7157, -117.1611), (37.7749, -122.4194),
+        (38.5816, -121.4944), (36.7378, -119.7871),
+    ])
+    path = os.path.join(tempfile.gettempdir(), "bench_site_index.npz")
+    for n in (1_000, 100_000, 300_000):
+        sites = random_sites(n)
+        ids = [f"site {i}" for i in range(n)]
+        index = SpatialIndex()
+        build = min(timeit.repeat(lambda: SpatialIndex().insert_many(ids, sites), number=1, repeat=3))
+        index.insert_many(ids, sites)
+        q = (37.3, -121.9)
+        nearest = per_call_us(lambda: index.nearest(*q, k=5))
+        radius = per_call_us(lambda: index.within_radius(*q, 10.0))
+        bbox = per_call_us(lambda: index.within_bbox(37.2, -122.0, 37.4, -121.8))
+        new_ids = itertools.count()
+        insert = per_call_us(lambda: index.insert(f"new site {next(new_ids)}", 37.31, -121.91))
+        assign = min(timeit.repeat(lambda: depots.nearest_many(sites), number=1, repeat=3))
+        index.save(path)
+        load = min(timeit.repeat(lambda: SpatialIndex.load(path), number=1, repeat=3))
+        print(
+            f"{n:>7} sites | build {build * 1e3:7.1f} ms | nearest(5) {nearest:6.1f} us"
+            f" | radius(10 km) {radius:6.1f} us | bbox {bbox:6.1f} us | insert {insert:5.1f} us"
+            f" | assign all to depots {assign * 1e3:6.1f} ms | load {load * 1e3:6.1f} ms"
+        )
+    os.remove(path)
@@ -0,0 +1,70 @@
+# benchmarks/bench_startup.py
+"""
+Cold import vs warm rerun of the app modules, each in a fresh interpreter.
+Cold is the first execution of the module with nothing imported yet; warm
+re-executes its body with every dependency already loaded, which is what
+Streamlit does with streamlit_app.py on each widget interaction. Modules
+whose dependencies are not installed here (streamlit, snowpark, ...) are
+reported as unavailable.
+
+    python -m benchmarks.bench_startup
+"""
+import json
+import subprocess
+import sys
+
+MODULES = (
+    "tracing",
+    "resources",
+    "sse_stream",
+    "address_detector",
+    "flexpolyline",
+    "route_simplify",
+    "route_planner",
+    "here_client",
+    "call_here_api",
+    "semantic_matcher",
+    "transcript_index",
+    "query_pipeline",
+    "bin_request_retrieval",
+    "streamlit_app",
+)
+# Heavy libraries that should only load on the path that needs them
+HEAVY = ("pandas", "pydeck", "altair", "numpy", "requests")
+
+CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+try:
+    module = importlib.import_module(sys.argv[1])
+except Exception as e:
+    print(json.dumps({"error": f"{type(e).__name__}: {e}"}))
+    sys.exit()
+cold = time.perf_counter() - start
+start = time.perf_counter()
+importlib.reload(module)
+warm = time.perf_counter() - start
+heavy = [m for m in %r if m in sys.modules]
+print(json.dumps({"cold": cold, "warm": warm, "heavy": heavy}))
+""" % (HEAVY,)
+
+
+def measure(module: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, module], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    print(f"{'module':<24} {'cold ms':>9} {'warm ms':>9}  heavy imports")
+    for module in MODULES:
+        r = measure(module)
+        if "error" in r:
+            print(f"{module:<24} {'unavailable':>19}  {r['error']}")
+            continue
+        print(f"{module:<24} {r['cold'] * 1e3:>9.1f} {r['warm'] * 1e3:>9.2f}  {', '.join(r['heavy']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/bench_transcript_index.py
+"""
+Transcript index build time, posting memory and BM25 query latency on synthetic
+sales call transcripts, with and without attribute filters, plus the cost
+of applying a batch of change-tracking updates.
+
+    python -m benchmarks.bench_transcript_index
+"""
+import timeit
+
+import numpy as np
+
+from transcript_index import TranscriptIndex
+
+REPS     = ("Sarah Johnson", "Mike Chen", "Rachel Torres", "James Wilson")
+STAGES   = ("Discovery", "Demo", "Negotiation", "Technical Review", "Closing")
+PRODUCTS = ("Enterprise Suite", "Basic Package", "Premium Security", "Analytics Pro")
+QUERIES  = ("legacy system migration", "pricing roi", "security compliance audit", "api integration timeline")
+
+
+def synthetic_transcripts(n: int, words: int = 150, vocabulary: int = 20_000, seed: int = 0):
+    """~`words`-word transcripts drawn from a Zipf-like vocabulary, like call notes."""
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocabulary)])
+    for term in " ".join(QUERIES).split():
+        vocab[rng.integers(50, 2_000)] = term
+    weights = 1.0 / np.arange(1, vocabulary + 1)
+    weights /= weights.sum()
+    for i in range(n):
+        text = " ".join(vocab[rng.choice(vocabulary, words, p=weights)])
+        yield f"CONV{i:06d}", text, {
+            "customer_name": f"Customer {i % 5_000}",
+            "sales_rep":     REPS[i % len(REPS)],
+            "deal_stage":    STAGES[i % len(STAGES)],
+            "product_line":  PRODUCTS[i % len(PRODUCTS)],
+        }
+
+
+def per_call_ms(fn, number: int = 50) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e3
+
+
+if __name__ == "__main__":
+    by_rep = {"@eq": {"sales_rep": "Mike Chen"}}
+    by_rep_stage = {"@and": [by_rep, {"@not": {"@eq": {"deal_stage": "Closing"}}}]}
+    for n in (1_000, 10_000, 100_000):
+        docs = list(synthetic_transcripts(n))
+        index = TranscriptIndex()
+        build = min(timeit.repeat(lambda: index.upsert_many(docs), number=1, repeat=1))
+        stats = index.stats()
+        plain  = max(per_call_ms(lambda q=q: index.search(q)) for q in QUERIES)
+        rep    = max(per_call_ms(lambda q=q: index.search(q, filter=by_rep)) for q in QUERIES)
+        nested = max(per_call_ms(lambda q=q: index.search(q, filter=by_rep_stage)) for q in QUERIES)
+        updates = docs[:: max(1, n // 1_000)]
+        update = min(timeit.repeat(lambda: index.upsert_many(updates), number=1, repeat=3)) * 1e3
+        print(
+            f"{n:>7} transcripts | build {build:6.2f} s, {stats['array_bytes'] / 2**20:6.1f} MiB postings"
+            f" | query {plain:5.2f} ms | + rep filter {rep:5.2f} ms | + and/not {nested:5.2f} ms"
+            f" | {len(updates)} updates {update:6.1f} ms"
+        )
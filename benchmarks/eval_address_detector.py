@@ -0,0 +1,64 @@
+# benchmarks/eval_address_detector.py
+"""
+Precision / recall of the local address detector on labelled chat queries.
+
+    python -m benchmarks.eval_address_detector
+"""
+import timeit
+
+from address_detector import looks_like_address
+
+# (query, contains a street address)
+LABELLED_QUERIES = [
+    ("Route from 123 Main St Springfield, IL 62701 to 456 Oak Ave Chicago", True),
+    ("Show me 456 Rue Example Montréal QC H2X 1Y4 on a map", True),
+    ("How far is 1600 Amphitheatre Parkway, Mountain View, CA 94043?", True),
+    ("Drive between 350 Fifth Avenue New York and 11 Wall Street", True),
+    ("Map 1200 boul. René-Lévesque O, Montréal", True),
+    ("Where is 12, rue Saint-Denis?", True),
+    ("Deliver a bin to 75 Queen Street, Ottawa ON K1P 1N2", True),
+    ("route entre 300 chemin de la Côte-Sainte-Catherine et 5333 av Casgrain", True),
+    ("Send the container to H3B 4W8", True),
+    ("Customer site: 22 Industrial Dr, Austin TX 78701", True),
+    ("1 Infinite Loop Cupertino", True),  # no street-type token: known miss
+    ("What is the total deal value by sales rep this quarter?", False),
+    ("Which deals closed between January and March 2024?", False),
+    ("Show the top 5 customers by revenue", False),
+    ("Summarize the call with TechCorp about Legacy System X", False),
+    ("How many deals over 50000 did Sarah Johnson win?", False),
+    ("Compare Q1 and Q2 win rates for the Enterprise Suite", False),
+    ("List all pending deals for SecureBank Ltd", False),
+    ("What did the client say about the 30 day trial?", False),
+    ("Average deal size in 2024 for Premium Security", False),
+    ("Who is the account manager for SmallBiz Solutions?", False),
+    ("We need 3 bins of 20 yd³ for mixed waste", False),
+    ("Give me the 10 largest deals and their close dates", False),
+    ("I want 5 pl", False),
+    ("Show deals 2 st", False),
+    ("How many deals closed on 15 Way?", False),
+]
+
+
+def evaluate():
+    tp = fp = fn = tn = 0
+    for query, label in LABELLED_QUERIES:
+        predicted = looks_like_address(query)
+        tp += predicted and label
+        fp += predicted and not label
+        fn += label and not predicted
+        tn += not predicted and not label
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall    = tp / (tp + fn) if tp + fn else 0.0
+    return precision, recall, (tp, fp, fn, tn)
+
+
+if __name__ == "__main__":
+    precision, recall, (tp, fp, fn, tn) = evaluate()
+    queries = [q for q, _ in LABELLED_QUERIES]
+    per_query = min(timeit.repeat(lambda: [looks_like_address(q) for q in queries], number=200, repeat=5))
+    per_query /= 200 * len(queries)
+    print(f"precision {precision:.2f} | recall {recall:.2f} | tp={tp} fp={fp} fn={fn} tn={tn}")
+    print(f"{per_query * 1e6:.1f} µs per query")
+    for query, label in LABELLED_QUERIES:
+        if looks_like_address(query) != label:
+            print(f"  mismatch (label={label}): {query}")
@@ -0,0 +1,77 @@
+# benchmarks/eval_semantic_matcher.py
+"""
+Hit rate and precision of the semantic model fast path on labelled chat
+queries: a question labelled True should get templated SQL, every other
+one must go to the agent.
+
+    python -m benchmarks.eval_semantic_matcher
+"""
+import timeit
+
+from semantic_matcher import SemanticMatcher
+
+# (query, answerable from the semantic model alone)
+LABELLED_QUERIES = [
+    ("What is the total deal value by sales rep?", True),
+    ("Total deal value", True),
+    ("Revenue by product line", True),
+    ("How many deals per month in 2024?", True),
+    ("Average deal value for Sarah Johnson", True),
+    ("Show the top 5 customers by revenue", True),
+    ("Revenue by product line for won deals", True),
+    ("Deal value for Sarah Johnson and Mike Chen", True),
+    ("Number of deals by sales stage", True),
+    ("Lowest deal value by salesperson", True),
+    ("Monthly revenue", True),
+    ("Highest deal value per client in 2024", True),
+    ("Which sales rep has the highest deal value?", True),
+    ("What is the total deal value by sales rep this quarter?", False),
+    ("Which deals closed between January and March 2024?", False),
+    ("Summarize the call with TechCorp about Legacy System X", False),
+    ("How many deals over 50000 did Sarah Johnson win?", False),
+    ("Compare Q1 and Q2 win rates for the Enterprise Suite", False),
+    ("List all pending deals for SecureBank Ltd", False),
+    ("How many customers do we have?", False),
+    ("Average deal size in 2024 for Premium Security", False),
+    ("Who is the account manager for SmallBiz Solutions?", False),
+    ("Revenue by rep excluding lost deals", False),
+    ("How many deals closed?", False),  # "closed": the stage or the win flag
+    ("deal value per deal", False),  # the group would be dropped
+    ("Route from 123 Main St Springfield to 456 Oak Ave Chicago", False),
+]
+# Matches whose SQL must end a certain way, e.g. a single top group
+EXPECTED_SQL_ENDINGS = {
+    "Which sales rep has the highest deal value?": "ORDER BY MAX_DEAL_VALUE DESC LIMIT 1",
+    "Show the top 5 customers by revenue":         "LIMIT 5",
+}
+
+
+def evaluate(matcher: SemanticMatcher):
+    tp = fp = fn = tn = 0
+    for query, label in LABELLED_QUERIES:
+        predicted = matcher.match(query) is not None
+        tp += predicted and label
+        fp += predicted and not label
+        fn += label and not predicted
+        tn += not predicted and not label
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    hit_rate  = tp / (tp + fn) if tp + fn else 0.0
+    return precision, hit_rate, (tp, fp, fn, tn)
+
+
+if __name__ == "__main__":
+    matcher = SemanticMatcher.from_file()
+    precision, hit_rate, (tp, fp, fn, tn) = evaluate(matcher)
+    queries = [q for q, _ in LABELLED_QUERIES]
+    per_query = min(timeit.repeat(lambda: [matcher.match(q) for q in queries], number=200, repeat=5))
+    per_query /= 200 * len(queries)
+    print(f"precision {precision:.2f} | hit rate {hit_rate:.2f} | tp={tp} fp={fp} fn={fn} tn={tn}")
+    print(f"{per_query * 1e6:.1f} µs per query")
+    for query, label in LABELLED_QUERIES:
+        match = matcher.match(query)
+        if (match is not None) != label:
+            print(f"  mismatch (label={label}): {query}")
+        elif match is not None and not match.sql.endswith(EXPECTED_SQL_ENDINGS.get(query, "")):
+            print(f"  wrong SQL: {query}\n    {match.sql}")
+        elif match is not None:
+            print(f"  {query}\n    {match.sql}  {list(match.params)}")
@@ -0,0 +1,82 @@
+# benchmarks/fake_cortex.py
+"""
+Synthetic Cortex agent responses for offline tests and benchmarks: SSE event
+logs (as decoded events, as the JSON array returned by
+_snowflake.send_snow_api_request, or as a raw text/event-stream) and
+COMPLETE envelopes like the ones parsed for bin requests.
+"""
+import json
+import random
+import time
+from typing import Iterator, List
+
+WORDS = (
+    "the deal with TechCorp closed in Q2 after a technical deep dive and "
+    "the client asked for an ROI analysis of the enterprise suite"
+).split()
+
+
+def synthetic_events(n_tokens: int, with_sql: bool = True, n_citations: int = 3, seed: int = 0) -> List[dict]:
+    """`n_tokens` message.delta text events, then one tool_results event."""
+    rng = random.Random(seed)
+    events = [{"event": "response.status", "data": {"status": "started"}}]
+    for _ in range(n_tokens):
+        events.append({
+            "event": "message.delta",
+            "data": {"delta": {"content": [{"type": "text", "text": rng.choice(WORDS) + " "}]}},
+        })
+    tool_json = {
+        "text": "Here are the results.",
+        "searchResults": [
+            {"source_id": i, "doc_id": f"CONV{i:03d}"} for i in range(n_citations)
+        ],
+    }
+    if with_sql:
+        tool_json["sql"] = "SELECT sales_rep, SUM(deal_value) FROM sales_metrics GROUP BY 1;"
+    events.append({
+        "event": "message.delta",
+        "data": {"delta": {"content": [{
+            "type": "tool_results",
+            "tool_results": {"content": [{"type": "json", "json": tool_json}]},
+        }]}},
+    })
+    events.append({"event": "done", "data": "[DONE]"})
+    return events
+
+
+def events_as_json_array(events: List[dict]) -> str:
+    """Content of a non-streaming _snowflake.send_snow_api_request response."""
+    return json.dumps(events)
+
+
+def events_as_sse(events: List[dict]) -> str:
+    """Same events as a raw text/event-stream body."""
+    return "".join(
+        f"event: {e['event']}\ndata: {json.dumps(e['data'])}\n\n" for e in events
+    )
+
+
+def fake_sse_source(events: List[dict], delay: float = 0.0, chunk_size: int = 64) -> Iterator[bytes]:
+    """Stream the SSE body in arbitrary byte chunks, sleeping `delay` between them."""
+    body = events_as_sse(events).encode("utf-8")
+    for pos in range(0, len(body), chunk_size):
+        if delay:
+            time.sleep(delay)
+        yield body[pos:pos + chunk_size]
+
+
+def complete_envelope(container_format: str = "20 yd³", quantity: str = "2", date_needed: str = "2025-08-12",
+                      requester: str = "alice.smith@gmail.com") -> str:
+    """A SNOWFLAKE.CORTEX.COMPLETE response as returned with options ({})."""
+    inner = json.dumps({
+        "container_format": container_format,
+        "quantity": quantity,
+        "date_needed": date_needed,
+        "requester": requester,
+    })
+    return json.dumps({
+        "choices": [{"messages": inner}],
+        "created": 1754000000,
+        "model": "claude-4-sonnet",
+        "usage": {"completion_tokens": 40, "prompt_tokens": 120, "total_tokens": 160},
+    })
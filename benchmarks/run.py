@@ -0,0 +1,194 @@
+# benchmarks/run.py
+"""
+Offline benchmark suite for the hot paths run on every interaction:
+flexpolyline encode/decode, Cortex SSE and COMPLETE envelope parsing,
+the map payload and route metrics.
+No network, no Snowflake: inputs are synthetic (see fake_cortex.py).
+
+    python -m benchmarks.run                   # compare with baselines.json
+    python -m benchmarks.run --quick           # skip the largest sizes
+    python -m benchmarks.run --update-baseline # record the current numbers
+    python -m benchmarks.run --filter decode   # only matching cases
+
+Reports throughput (items/s) and peak traced memory per case; exits with
+status 1 when a case is slower than its baseline by more than --threshold.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import route_metrics
+import route_simplify
+from benchmarks.fake_cortex import (
+    complete_envelope, events_as_json_array, events_as_sse, fake_sse_source, synthetic_events,
+)
+from flexpolyline import CompactRoute, decode_array, decode_many, encode, encode_array, iter_decode
+from sse_stream import SSECollector, iter_events
+
+BASELINE_FILE     = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_THRESHOLD = 0.25  # tolerated slowdown before flagging a regression
+
+POLYLINE_SIZES = (10, 1_000, 100_000, 1_000_000)
+SSE_SIZES      = (10, 1_000, 50_000)
+ENVELOPE_SIZES = (10, 1_000)
+ROUTE_BATCH    = (1_000, 500)  # stored routes x points per route
+CUSTOMERS      = 1_000          # points of a corridor check
+# Pure python paths are too slow to be run on the largest inputs every time
+QUICK_MAX_ITEMS = 100_000
+
+
+@dataclass
+class Case:
+    name:  str
+    items: int                 # throughput unit: points, events, ...
+    run:   Callable[[], object]
+    slow:  bool = False        # skipped with --quick
+
+
+def random_route(n_points: int, seed: int = 0) -> np.ndarray:
+    """
+    Road-like route from Montréal: ~10 m steps along a slowly turning heading,
+    close to the vertex density and curvature of HERE polylines.
+    """
+    rng = np.random.default_rng(seed)
+    heading = np.cumsum(rng.normal(0.0, 0.05, n_points))
+    steps = 1e-4 * np.c_[np.sin(heading), np.cos(heading)]
+    return np.array([45.5017, -73.5673]) + np.cumsum(steps, axis=0)
+
+
+def build_cases() -> List[Case]:
+    cases = []
+    for n in POLYLINE_SIZES:
+        route   = random_route(n)
+        points  = [tuple(p) for p in route.tolist()]
+        encoded = encode_array(route)
+        tenth   = encode_array(route[:max(1, n // 10)])
+        slow    = n > QUICK_MAX_ITEMS
+        cases += [
+            Case(f"encode[{n}]", n, lambda p=points: encode(p), slow=slow),
+            Case(f"encode_array[{n}]", n, lambda r=route: encode_array(r), slow=slow),
+            Case(f"iter_decode[{n}]", n, lambda e=encoded: list(iter_decode(e)), slow=slow),
+            Case(f"decode_array[{n}]", n, lambda e=encoded: decode_array(e), slow=slow),
+            Case(f"decode_many[10x{max(1, n // 10)}]", 10 * max(1, n // 10),
+                 lambda e=tenth: decode_many([e] * 10), slow=slow),
+            Case(f"compact_route[{n}]", n, lambda e=encoded: CompactRoute.from_encoded(e), slow=slow),
+            Case(f"map_payload[{n}]", n, lambda r=route: _cold_map_payload(r), slow=slow),
+            Case(f"route_summary[{n}]", n, lambda r=route: route_metrics.route_summary(r), slow=slow),
+        ]
+    n_routes, n_points = ROUTE_BATCH
+    routes = [random_route(n_points, seed) for seed in range(n_routes)]
+    route = routes[0]
+    customers = np.resize(route, (CUSTOMERS, 2)) + 0.002
+    cases += [
+        Case(f"route_summary_many[{n_routes}x{n_points}]", n_routes,
+             lambda r=routes: route_metrics.summarize_many(r)),
+        Case(f"corridor[{CUSTOMERS}x{n_points}]", CUSTOMERS,
+             lambda c=customers, r=route: route_metrics.within_corridor(c, r, 1.0)),
+    ]
+    for n in SSE_SIZES:
+        events = synthetic_events(n)
+        as_json, as_sse = events_as_json_array(events), events_as_sse(events)
+        slow = n > QUICK_MAX_ITEMS
+        cases += [
+            Case(f"sse_collect_events[{n}]", n, lambda e=events: SSECollector(e).collect(), slow=slow),
+            Case(f"sse_collect_json_array[{n}]", n,
+                 lambda c=as_json: SSECollector(iter_events(c)).collect(), slow=slow),
+            Case(f"sse_collect_event_stream[{n}]", n,
+                 lambda c=as_sse: SSECollector(iter_events(c)).collect(), slow=slow),
+            # streamed body split in 64-byte chunks, as read from the agent
+            Case(f"sse_collect_chunked_stream[{n}]", n,
+                 lambda e=events: SSECollector(iter_events(fake_sse_source(e))).collect(), slow=slow),
+        ]
+    for n in ENVELOPE_SIZES:
+        envelopes = [complete_envelope(quantity=str(i)) for i in range(n)]
+        cases.append(Case(f"complete_envelope[{n}]", n, lambda e=envelopes: _parse_envelopes(e)))
+    return cases
+
+
+def _parse_envelopes(envelopes: List[str]) -> List[dict]:
+    """COMPLETE envelopes → bin request fields, as the extraction SQL does."""
+    return [json.loads(json.loads(e)["choices"][0]["messages"]) for e in envelopes]
+
+
+def _cold_map_payload(route: np.ndarray):
+    """display_map's payload without the per-route pyramid memoization."""
+    route_simplify._pyramids.clear()
+    return route_simplify.path_layer_data(route)
+
+
+def measure(case: Case, min_time: float = 0.2, repeat: int = 3) -> Dict[str, float]:
+    """Best-of-`repeat` throughput over at least `min_time` seconds, and peak memory."""
+    start = time.perf_counter()
+    case.run()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / max(once, 1e-9)))
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            case.run()
+        best = min(best, (time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    case.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "items_per_s": case.items / best, "peak_bytes": peak}
+
+
+def load_baselines() -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="skip the largest inputs")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines()
+    results, regressions = {}, []
+    for case in build_cases():
+        if args.filter not in case.name or (args.quick and case.slow):
+            continue
+        result = results[case.name] = measure(case)
+        line = (
+            f"{case.name:<34} {result['items_per_s']:>14,.0f} items/s"
+            f" {result['seconds'] * 1e3:>10.3f} ms {result['peak_bytes'] / 2**20:>9.2f} MiB"
+        )
+        base = baselines.get(case.name)
+        if base:
+            ratio = result["items_per_s"] / base["items_per_s"]
+            line += f"  {ratio:5.2f}x baseline"
+            if ratio < 1 - args.threshold:
+                line += "  REGRESSION"
+                regressions.append(case.name)
+        print(line, flush=True)
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baselines written to {BASELINE_FILE}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
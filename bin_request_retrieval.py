@@ -1,86 +1,242 @@
 # bin_request_retrieval.py
 
 import json
-from snowflake.snowpark.context import get_active_session
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
 
-session = get_active_session()
+from resources import snowpark_session
 
-def fetch_bin_requests() -> list[dict]:
-    """
-    Fetch unread emails, call Cortex.COMPLETE, unwrap the envelope
-    under choices[0].messages, and return:
-      - message_id
-      - raw_body
-      - json_output (the *inner* JSON string)
-      - container_format, quantity, date_needed, requester
-    """
-    REQUEST_SQL = """
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+
+EXTRACTIONS_TABLE = "bin_request_extractions"
+EMAILS_STREAM     = "emails_webinar_202508_stream"
+
+# Minimum seconds between two stream checks from the UI (reruns are frequent)
+REFRESH_INTERVAL  = 30
+
+# Incremental extraction stage: runs Cortex.COMPLETE only on emails the
+# append-only stream has not delivered yet (see setup.sql), unwraps the
+# envelope (choices[0].messages) and the five keys in SQL, and persists the
+# result keyed by message_id. Reading the stream in the MERGE consumes it.
+EXTRACTION_SQL = f"""
+MERGE INTO {EXTRACTIONS_TABLE} t
+USING (
+  WITH completed AS (
     SELECT
+      id,
       message_id,
-      body AS raw_body,
+      received_at,
       SNOWFLAKE.CORTEX.COMPLETE(
         'claude-4-sonnet',
         [
-          {'role':'system',
+          {{'role':'system',
            'content': $$Extract a JSON object with exactly these keys:
-             "container_format","quantity","date_needed","requester".
-             Output only the JSON object (no markdown).$$},
-          {'role':'user', 'content': body}
+             "container_format","quantity","date_needed","requester","site_address".
+             Output only the JSON object (no markdown).$$}},
+          {{'role':'user', 'content': body}}
         ],
-        {}
+        {{}}
       ) AS full_response
-    FROM emails_webinar_202508
-    WHERE is_read = FALSE
-    LIMIT 5
+    FROM {EMAILS_STREAM}
+    WHERE METADATA$ACTION = 'INSERT'
+      AND is_read = FALSE
+  ),
+  unwrapped AS (
+    SELECT
+      *,
+      COALESCE(TRY_PARSE_JSON(full_response):choices[0]:messages::STRING, '') AS json_output
+    FROM completed
+  )
+  SELECT
+    id,
+    message_id,
+    COALESCE(received_at, '1970-01-01'::TIMESTAMP_NTZ)                        AS received_at,
+    json_output,
+    COALESCE(TRY_PARSE_JSON(json_output):container_format::STRING, '')        AS container_format,
+    COALESCE(TRY_PARSE_JSON(json_output):quantity::STRING, '')                AS quantity,
+    COALESCE(TRY_PARSE_JSON(json_output):date_needed::STRING, '')             AS date_needed,
+    COALESCE(TRY_PARSE_JSON(json_output):requester::STRING, '')               AS requester,
+    COALESCE(TRY_PARSE_JSON(json_output):site_address::STRING, '')            AS site_address
+  FROM unwrapped
+) s
+  ON t.message_id = s.message_id
+WHEN NOT MATCHED THEN INSERT (
+  message_id, email_id, received_at, json_output,
+  container_format, quantity, date_needed, requester, site_address
+) VALUES (
+  s.message_id, s.id, s.received_at, s.json_output,
+  s.container_format, s.quantity, s.date_needed, s.requester, s.site_address
+)
+"""
+
+# Review queue read from the materialized results, never from the LLM.
+# Keyset pagination on (received_at, id): ? placeholders are, in order,
+# received_at, received_at, id of the last row of the previous page, and the page size.
+REQUEST_SQL = f"""
+SELECT
+  x.email_id         AS id,
+  x.received_at,
+  x.message_id,
+  COALESCE(e.body, '') AS raw_body,
+  x.json_output,
+  x.container_format,
+  x.quantity,
+  x.date_needed,
+  x.requester,
+  x.site_address
+FROM {EXTRACTIONS_TABLE} x
+JOIN emails_webinar_202508 e
+  ON e.message_id = x.message_id
+WHERE e.is_read = FALSE
+  AND (x.received_at > ? OR (x.received_at = ? AND x.email_id > ?))
+ORDER BY x.received_at, x.email_id
+LIMIT ?
+"""
+
+DECISIONS = ("APPROVED", "REJECTED")
+
+# ? placeholders: decision, decision (NULL keeps the previous one), and a JSON
+# array of message_ids
+MARK_SQL = """
+UPDATE emails_webinar_202508
+SET is_read    = TRUE,
+    decision   = COALESCE(?, decision),
+    decided_at = IFF(? IS NULL, decided_at, CURRENT_TIMESTAMP())
+WHERE message_id IN (
+  SELECT f.value::STRING FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) f
+)
+"""
+
+_last_refresh = 0.0
+
+REQUEST_KEYS = (
+    "message_id", "raw_body", "json_output",
+    "container_format", "quantity", "date_needed", "requester", "site_address",
+)
+
+
+@dataclass
+class FetchStats:
+    """Throughput of a paged fetch, updated after every page."""
+    rows:    int   = 0
+    pages:   int   = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def refresh_extractions(force: bool = False) -> int:
+    """
+    Extract the emails that arrived since the last run into the results
+    table. Cheap no-op when the stream is empty or when called again within
+    REFRESH_INTERVAL seconds (unless `force`). Returns the number of new rows.
     """
-    df  = session.sql(REQUEST_SQL)
-    pdf = df.to_pandas()
+    global _last_refresh
+    now = time.time()
+    if not force and now - _last_refresh < REFRESH_INTERVAL:
+        return 0
+    # claimed up front so concurrent reruns skip; released if the run fails
+    previous, _last_refresh = _last_refresh, now
 
-    results = []
-    for row in pdf.itertuples(index=False):
-        raw     = row.RAW_BODY or ""
-        outer_j = row.FULL_RESPONSE or "{}"
-
-        # 1) parse the outer envelope
-        try:
-            outer = json.loads(outer_j)
-        except json.JSONDecodeError:
-            outer = {}
-
-        # 2) drill into choices[0].messages
-        choices = outer.get("choices", [])
-        if choices and isinstance(choices, list):
-            msg_str = choices[0].get("messages", "")
-        else:
-            msg_str = ""
-
-        # 3) parse that inner JSON
-        try:
-            inner = json.loads(msg_str)
-        except json.JSONDecodeError:
-            inner = {}
-
-        # 4) pull out your four keys (default to empty string)
-        fmt = inner.get("container_format", "")
-        qty = inner.get("quantity", "")
-        dt  = inner.get("date_needed", "")
-        req = inner.get("requester", "")
-
-        results.append({
-            "message_id":       row.MESSAGE_ID,
-            "raw_body":         raw,
-            "json_output":      msg_str,    # the *inner* JSON
-            "container_format": fmt,
-            "quantity":         qty,
-            "date_needed":      dt,
-            "requester":        req,
-        })
+    start = time.perf_counter()
+    try:
+        has_data = snowpark_session().sql(
+            f"SELECT SYSTEM$STREAM_HAS_DATA('{EMAILS_STREAM}')"
+        ).collect()[0][0]
+        if not has_data:
+            return 0
+        result = snowpark_session().sql(EXTRACTION_SQL).collect()
+    except Exception:
+        _last_refresh = previous
+        raise
+    inserted = result[0][0] if result else 0
+    logger.info(
+        "extracted %d new bin requests in %.1fs", inserted, time.perf_counter() - start
+    )
+    return inserted
+
+
+def iter_bin_request_batches(
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_rows: Optional[int] = None,
+    stats: Optional[FetchStats] = None,
+) -> Iterator[list[dict]]:
+    """
+    Yield unread bin requests page by page from the materialized extraction
+    results (keyset pagination on received_at, id). Each request dict has
+    the keys of fetch_bin_requests(). Call refresh_extractions() first to
+    pick up new emails.
+    Throughput is logged per page and accumulated into `stats` if given.
+    """
+    stats = stats if stats is not None else FetchStats()
+    last_received, last_id = "1970-01-01 00:00:00", -1
 
+    while max_rows is None or stats.rows < max_rows:
+        limit = page_size if max_rows is None else min(page_size, max_rows - stats.rows)
+        start = time.perf_counter()
+        rows = snowpark_session().sql(
+            REQUEST_SQL, params=[last_received, last_received, last_id, limit]
+        ).collect()
+        stats.seconds += time.perf_counter() - start
+        if not rows:
+            return
+
+        stats.rows  += len(rows)
+        stats.pages += 1
+        logger.info(
+            "bin requests page %d: %d rows, %.1f rows/s overall",
+            stats.pages, len(rows), stats.rows_per_second,
+        )
+        last_received, last_id = rows[-1]["RECEIVED_AT"], rows[-1]["ID"]
+        yield [{k: row[k.upper()] for k in REQUEST_KEYS} for row in rows]
+
+        if len(rows) < limit:
+            return
+
+
+def fetch_bin_requests(limit: int = 5) -> list[dict]:
+    """
+    Extract any new emails, then return the first `limit` unread requests:
+      - message_id
+      - raw_body
+      - json_output (the *inner* JSON string)
+      - container_format, quantity, date_needed, requester, site_address
+    """
+    refresh_extractions()
+    results = []
+    for batch in iter_bin_request_batches(page_size=limit, max_rows=limit):
+        results.extend(batch)
     return results
 
+def mark_requests(
+    message_ids: Iterable[str], status: Optional[str] = None, wait: bool = True
+):
+    """
+    Mark all `message_ids` as read and record the reviewer decision
+    (APPROVED / REJECTED, or None to only mark them read) in one
+    set-based statement. IDs are bound as a single JSON array parameter.
+    Returns the collected rows; with `wait=False` it returns the Snowpark
+    AsyncJob instead, whose `.result()` raises if the UPDATE failed.
+    """
+    ids = list(dict.fromkeys(message_ids))
+    if status is not None:
+        status = status.upper()
+        if status not in DECISIONS:
+            raise ValueError(f"status must be one of {DECISIONS}, got {status!r}")
+    if not ids:
+        return [] if wait else None
+
+    df = snowpark_session().sql(
+        MARK_SQL, params=[status, status, json.dumps(ids)]
+    )
+    return df.collect() if wait else df.collect_nowait()
+
+
 def mark_request_read(message_id: str) -> None:
-    session.sql(f"""
-      UPDATE emails_webinar_202508
-      SET is_read = TRUE
-      WHERE message_id = '{message_id}'
-    """).collect()
+    mark_requests([message_id])
@@ -1,72 +1,311 @@
 # call_here_api.py
 import os
-import _snowflake
-import requests
-from typing import Tuple, Dict, List, Union
-from flexpolyline import decode
+import tempfile
+from dataclasses import dataclass
+from typing import Tuple, Dict, Hashable, List, Optional, Union
+import numpy as np
+from flexpolyline import CompactRoute, decode_array, decode_many, encode_array
+from geocode_cache import GeocodeCache, normalize_address
+from resources import here_api_key, resource
+from here_client import HereClient, MATRIX_SYNC_MAX_POINTS, ROUTE_MAX_VIA
+from route_cache import RouteCache, route_polylines
+from route_metrics import route_summary, within_corridor
+from route_planner import fill_travel_times, plan_order
+from route_simplify import DEFAULT_TOLERANCE_PX, path_layer_data
+from spatial_index import KM_PER_DEGREE, SpatialIndex
+from tracing import propagate, span
 
 
-secret = _snowflake.get_generic_secret_string("here_api_key")
-os.environ["HERE_API_KEY"] = secret
+# Every geocoded site, persisted so the index survives restarts
+SITE_INDEX_PATH       = os.environ.get("SITE_INDEX_PATH", os.path.join(tempfile.gettempdir(), "site_index.npz"))
+SITE_INDEX_SAVE_EVERY = 50  # new or moved sites between two saves
+CORRIDOR_KM           = 1.0 # known sites "on the way" in the map view
+
+# All live as long as the module, i.e. across Streamlit reruns
+geocode_cache = GeocodeCache()
+route_cache   = RouteCache()
+
+
+@resource
+def here_client() -> HereClient:
+    """Shared HERE client; the secret is only read on the first HERE call."""
+    return HereClient(here_api_key(), cache=geocode_cache)
+
+
+@resource
+def site_index() -> SpatialIndex:
+    """Spatial index of every geocoded site, keyed by normalized address."""
+    if os.path.exists(SITE_INDEX_PATH):
+        try:
+            return SpatialIndex.load(SITE_INDEX_PATH)
+        except (OSError, ValueError, KeyError):
+            pass
+    return SpatialIndex()
+
+
+def remember_sites(addresses: List[str], geos: List[Union[Dict, Exception]]) -> None:
+    """Add the successfully geocoded `addresses` to the site index."""
+    keys, points = [], []
+    for addr, geo in zip(addresses, geos):
+        pos = _geo_position(geo)
+        if pos is not None:
+            keys.append(normalize_address(addr))
+            points.append(pos)
+    if not keys:
+        return
+    index = site_index()
+    index.insert_many(keys, points)
+    if index.unsaved >= SITE_INDEX_SAVE_EVERY:
+        try:
+            index.save(SITE_INDEX_PATH)
+        except OSError:
+            pass
+
+
+def sites_near_route(coords, km: float = CORRIDOR_KM) -> List[str]:
+    """Known sites within `km` of the route, e.g. customers that can be served on the way."""
+    route = np.asarray(coords, dtype=np.float64)
+    if not len(route):
+        return []
+    margin = km / KM_PER_DEGREE
+    low, high = route[:, :2].min(axis=0), route[:, :2].max(axis=0)
+    index = site_index()
+    # generous box (longitude degrees shrink with latitude), refined below
+    lon_margin = margin / max(np.cos(np.radians(np.abs(route[:, 0]).max())), 1e-6)
+    ids = index.within_bbox(low[0] - margin, low[1] - lon_margin, high[0] + margin, high[1] + lon_margin)
+    if not ids:
+        return []
+    points = [index.position(i) for i in ids]
+    inside = within_corridor(points, route, km)
+    return [i for i, keep in zip(ids, inside) if keep]
+
 
 def call_geocoding_here_api(address: str) -> Dict:
-    params = {
-        "q":      address,
-        "apiKey": secret,
-    }
-    resp = requests.get(
-        "https://geocode.search.hereapi.com/v1/geocode",
-        params=params,
-        timeout=30
-    )
-    resp.raise_for_status()
-    return resp.json()
+    geo = here_client().geocode(address)
+    remember_sites([address], [geo])
+    return geo
+
+
+def geocode_many(addresses: List[str]) -> List[Union[Dict, Exception]]:
+    """
+    Geocode several addresses concurrently; failures are returned in place
+    of the response so each address can be reported on its own.
+    """
+    geos = here_client().geocode_many(addresses, return_exceptions=True)
+    remember_sites(addresses, geos)
+    return geos
 
 
 def call_routing_here_api(
     origin: Tuple[float, float],
     destination: Tuple[float, float],
+    transport_mode: str = "car",
 ) -> Dict:
     """
     Call HERE Routing v8 and return the JSON.
     """
-    params = {
-        "transportMode": "car",
-        "origin":        f"{origin[0]},{origin[1]}",
-        "destination":   f"{destination[0]},{destination[1]}",
-        "return":        "polyline",
-        "apikey":        secret,
+    return here_client().route(origin, destination, transport_mode)
+
+
+def get_route(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    transport_mode: str = "car",
+) -> List[str]:
+    """
+    Encoded flexpolylines of the route origin → destination, from the
+    route cache when the same (quantized) trip was already requested.
+    Decode them with decode_polyline_array() only when the map is drawn.
+    """
+    with span("get_route", mode=transport_mode) as sp:
+        polylines = route_cache.get(origin, destination, transport_mode)
+        sp.set(cache="miss" if polylines is None else "hit")
+        if polylines is None:
+            polylines = route_polylines(
+                here_client().route(origin, destination, transport_mode)
+            )
+            if polylines:
+                route_cache.set(origin, destination, polylines, transport_mode)
+        sp.set(bytes=sum(map(len, polylines)))
+        return polylines
+
+
+def _route_via(stops: List[Tuple[float, float]], transport_mode: str) -> Optional[List[str]]:
+    """
+    One polyline per leg of `stops` from a single HERE request with via
+    waypoints; None when it fails or its sections are not one per leg.
+    """
+    try:
+        polylines = route_polylines(
+            here_client().route(stops[0], stops[-1], transport_mode, via=stops[1:-1])
+        )
+    except Exception:
+        return None
+    if len(polylines) != len(stops) - 1:
+        return None
+    for a, b, polyline in zip(stops[:-1], stops[1:], polylines):
+        route_cache.set(a, b, [polyline], transport_mode)
+    return polylines
+
+
+def route_legs(stops, transport_mode: str = "car") -> List[Optional[List[str]]]:
+    """
+    Encoded polylines of every leg between consecutive lat/lon `stops`, None
+    where a leg could not be routed. Legs missing from the route cache are
+    requested as via waypoints, up to ROUTE_MAX_VIA per HERE call (run
+    concurrently); the legs of a failed call are then routed one by one.
+    """
+    stops = [(float(lat), float(lng)) for lat, lng in np.asarray(stops, dtype=np.float64)[:, :2]]
+    legs: List[Optional[List[str]]] = [
+        route_cache.get(a, b, transport_mode) for a, b in zip(stops[:-1], stops[1:])
+    ]
+    chunks = {}
+    for first in range(0, len(legs), ROUTE_MAX_VIA + 1):
+        last = min(first + ROUTE_MAX_VIA + 1, len(legs))
+        if any(leg is None for leg in legs[first:last]):
+            chunks[first] = here_client().executor.submit(
+                propagate(_route_via), stops[first:last + 1], transport_mode
+            )
+    for first, future in chunks.items():
+        polylines = future.result()
+        if polylines is not None:
+            legs[first:first + len(polylines)] = [[p] for p in polylines]
+
+    # fallback, submitted from here: a pool thread waiting on the pool could deadlock
+    single = {
+        i: here_client().executor.submit(propagate(get_route), stops[i], stops[i + 1], transport_mode)
+        for i, leg in enumerate(legs) if leg is None
     }
-    # debug print to Streamlit
-    import streamlit as st
-    st.write(f"🔍 Debug — routing v8 params: {params}")
+    for i, future in single.items():
+        try:
+            legs[i] = future.result()
+        except Exception:
+            legs[i] = None
+    return legs
 
-    resp = requests.get(
-        "https://router.hereapi.com/v8/routes",
-        params=params,
-        timeout=30
+
+@dataclass
+class PlannedRoute:
+    """Multi-stop route: stops in visiting order and one combined polyline."""
+    addresses:     List[str]
+    positions:     np.ndarray  # (N, 2) lat/lon, visiting order
+    polyline:      str         # flexpolyline of all legs, ready for decode_polyline_array()
+    cost_seconds:  float
+    matrix_source: str         # "here" or "haversine"
+    failed:        List[str]   # addresses that could not be geocoded
+    straight_legs: int = 0     # legs that could not be routed, drawn as straight lines
+
+
+def _geo_position(geo) -> Optional[Tuple[float, float]]:
+    if isinstance(geo, Exception) or not geo.get("items"):
+        return None
+    pos = geo["items"][0]["position"]
+    return pos["lat"], pos["lng"]
+
+
+def plan_stops(
+    addresses: List[str],
+    return_to_start: bool = False,
+    transport_mode: str = "car",
+) -> PlannedRoute:
+    """
+    Plan a delivery tour starting at addresses[0]:
+      1) geocode every stop concurrently
+      2) travel-time matrix with one HERE Matrix call when small enough,
+         otherwise a local haversine estimate
+      3) visiting order by nearest neighbour + 2-opt
+      4) route the legs with via waypoints, few HERE calls (route cache
+         first, see route_legs()), and merge them into one flexpolyline
+    Stops that cannot be geocoded are skipped and listed in `failed`; when
+    the start itself fails, nothing is planned (empty route) rather than
+    silently starting, and returning, somewhere else.
+    """
+    geos = geocode_many(addresses)
+    kept, points, failed = [], [], []
+    for addr, geo in zip(addresses, geos):
+        pos = _geo_position(geo)
+        if pos is None:
+            failed.append(addr)
+        else:
+            kept.append(addr)
+            points.append(pos)
+    if not points or _geo_position(geos[0]) is None:
+        return PlannedRoute([], np.empty((0, 2)), encode_array([]), 0.0, "haversine", failed)
+    points = np.array(points, dtype=np.float64)
+
+    matrix, source = None, "haversine"
+    if 1 < len(points) <= MATRIX_SYNC_MAX_POINTS:
+        try:
+            # unreachable pairs come back as null: estimated locally
+            matrix = fill_travel_times(here_client().matrix(points.tolist(), transport_mode), points)
+        except Exception:
+            matrix = None
+        if matrix is not None:
+            source = "here"
+    order, cost = plan_order(points, matrix, 0, return_to_start)
+
+    stops = points[order]
+    if return_to_start and len(order) > 1:
+        stops = np.concatenate([stops, stops[:1]])
+    arrays, straight = [stops[:1]], 0
+    for k, polylines in enumerate(route_legs(stops, transport_mode)):
+        try:
+            if not polylines:
+                raise ValueError("no route")
+            arrays.append(decode_polyline_array(polylines)[:, :2])
+        except Exception:
+            # leg could not be routed: draw it as a straight line
+            arrays.append(stops[k:k + 2])
+            straight += 1
+
+    return PlannedRoute(
+        addresses=[kept[i] for i in order],
+        positions=points[order],
+        polyline=encode_array(np.concatenate(arrays)),
+        cost_seconds=cost,
+        matrix_source=source,
+        failed=failed,
+        straight_legs=straight,
     )
-    resp.raise_for_status()
-    return resp.json()
 
 
-def decode_polyline(data: Union[str, Dict]) -> List[Tuple[float, float]]:
+def _sections(data: Union[str, List[str], Dict]) -> List[str]:
+    """Flexpolylines of a HERE JSON response, a list of them or one string."""
+    if isinstance(data, dict):
+        return route_polylines(data)
+    return data if isinstance(data, list) else [data]
+
+
+def decode_polyline_array(data: Union[str, List[str], Dict]) -> np.ndarray:
     """
     Decode either:
-      - a HERE JSON response (dict) by recursing into routes→sections→polyline
-      - or a flexpolyline string by calling the imported decode()
+      - a HERE JSON response (dict): every routes→sections→polyline is decoded
+        in one batch by decode_many()
+      - a list of flexpolyline strings, e.g. from get_route(), same way
+      - or a flexpolyline string
+    into one (N, 2|3) float64 array. Sections with and without a third
+    dimension are joined on their lat/lon columns.
     """
-    if isinstance(data, dict):
-        coords: List[Tuple[float, float]] = []
-        for route in data.get("routes", []):
-            for section in route.get("sections", []):
-                poly = section.get("polyline")
-                if poly:
-                    coords.extend(decode_polyline(poly))
+    with span("decode_polyline") as sp:
+        arrays = decode_many(_sections(data))
+        if len({a.shape[1] for a in arrays}) > 1:
+            arrays = [a[:, :2] for a in arrays]
+        coords = np.concatenate(arrays) if arrays else np.empty((0, 2))
+        sp.set(points=len(coords))
         return coords
 
-    # Otherwise it's the flexpolyline‐encoded string
-    return decode(data)
+
+def decode_polyline(data: Union[str, List[str], Dict]) -> CompactRoute:
+    """
+    Same as decode_polyline_array() but as a CompactRoute: a sequence of
+    coordinate tuples backed by the polyline's packed int32 values, ~8 bytes
+    per point instead of ~110 for a list of tuples. Sections with different
+    headers are merged at the finest precision.
+    """
+    with span("decode_polyline") as sp:
+        route = CompactRoute.from_polylines(_sections(data))
+        sp.set(points=len(route), bytes=route.nbytes)
+        return route
 
 
 
@@ -75,23 +314,38 @@ def decode_polyline(data: Union[str, Dict]) -> List[Tuple[float, float]]:
 
 # in call_here_api.py
 
-def display_map(coords: List[Tuple[float, float]]):
-    import pandas as pd
+def display_map(
+    coords: Union[List[Tuple[float, float]], "np.ndarray", CompactRoute],
+    tolerance_px: float = DEFAULT_TOLERANCE_PX,
+    key: Optional[Hashable] = None,
+):
+    """Draw the route; `key` (e.g. its encoded polyline) memoizes its levels of detail."""
     import streamlit as st
     import pydeck as pdk
 
-    if not coords:
+    if len(coords) == 0:
         st.write("No route to display.")
         return
 
-    # Turn [(lat, lon), …] → [[ [lon, lat], … ]]
-    path = [[[lon, lat] for lat, lon in coords]]
-    df = pd.DataFrame({"path": path})
+    # Fit the view on the route, then only send the level of detail that is
+    # visible at that zoom (pyramid built once per route, memoized)
+    with span("map_payload", points=len(coords)) as sp:
+        data, zoom, (center_lat, center_lon), n_points = path_layer_data(coords, tolerance_px, key)
+        sp.set(sent=n_points, zoom=round(zoom, 1))
+    with span("route_metrics", points=len(coords)) as sp:
+        summary = route_summary(coords)
+        nearby = sites_near_route(coords)
+        sp.set(km=round(summary["km"], 1), nearby=len(nearby))
+    st.caption(
+        f"📏 {summary['km']:,.1f} km · ⏱ ~{summary['eta_s'] / 60:,.0f} min estimated · "
+        f"{len(nearby)} known site(s) within {CORRIDOR_KM:g} km · "
+        f"Route: {n_points:,} of {len(coords):,} points sent to the map"
+    )
 
     # Draw the route in bright red
     layer = pdk.Layer(
         "PathLayer",
-        data=df,
+        data=data,
         pickable=False,
         get_path="path",
         get_width=10,
@@ -101,12 +355,11 @@ def display_map(coords: List[Tuple[float, float]]):
         width_max_pixels=10         # maximum pixel width
     )
 
-    # Center on the first point
-    start_lat, start_lon = coords[0]
+    # Center on the route
     view_state = pdk.ViewState(
-        latitude=start_lat,
-        longitude=start_lon,
-        zoom=11
+        latitude=center_lat,
+        longitude=center_lon,
+        zoom=zoom
     )
 
     # Use a light basemap style
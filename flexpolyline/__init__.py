@@ -8,6 +8,9 @@ from .decoding import THIRD_DIM_MAP, get_third_dimension
 
 from .decoding import iter_decode
 from .encoding import encode
+from .array_decoding import decode_array, decode_many
+from .array_encoding import encode_array, PolylineEncoder
+from .compact_route import CompactRoute
 
 
 def dict_encode(coordinates, precision=5, third_dim=ABSENT, third_dim_precision=0):
@@ -0,0 +1,152 @@
+# Copyright (C) 2019 HERE Europe B.V.
+# Licensed under MIT, see full license in LICENSE
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+
+import numpy as np
+
+from .decoding import DECODING_TABLE, PolylineHeader, get_third_dimension, iter_decode
+from .encoding import FORMAT_VERSION
+
+__all__ = ['decode_array', 'decode_many']
+
+# 256 entries lookup table indexed by the raw byte value; -1 marks invalid chars
+BYTE_DECODING_TABLE = np.full(256, -1, dtype=np.int8)
+BYTE_DECODING_TABLE[45:45 + len(DECODING_TABLE)] = DECODING_TABLE
+
+# A varint longer than this does not fit in 64 bits, let the pure python decoder handle it
+MAX_VARINT_CHARS = 12
+
+
+def _to_bytes(encoded):
+    """Return the `encoded` polyline as an uint8 array"""
+    try:
+        return np.frombuffer(encoded.encode('ascii'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        raise ValueError('Invalid encoding')
+
+
+def _decode_unsigned_array(raw):
+    """Decode all the unsigned varints of an uint8 array at once.
+    Returns a tuple (values, ends) where `ends` are the char positions terminating each value.
+    Returns None when a value is too large to be decoded in 64 bits."""
+    chars = BYTE_DECODING_TABLE[raw]
+    if (chars < 0).any():
+        raise ValueError('Invalid encoding')
+    chars = chars.astype(np.uint64)
+
+    is_last = (chars & 0x20) == 0
+    if len(chars) and not is_last[-1]:
+        raise ValueError('Invalid encoding')
+
+    ends = np.flatnonzero(is_last)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    if len(ends) and (ends - starts).max() >= MAX_VARINT_CHARS:
+        return None
+
+    # position of every char inside its own varint, used as shift amount
+    position = np.arange(len(chars), dtype=np.uint64)
+    position -= np.repeat(starts, ends - starts + 1).astype(np.uint64)
+    chunks = (chars & 0x1F) << (position * np.uint64(5))
+    if not len(ends):
+        return np.empty(0, dtype=np.int64), ends
+    # chunks never overlap, so adding them is the same as or-ing them
+    return np.add.reduceat(chunks, starts).astype(np.int64), ends
+
+
+def _to_signed_array(values):
+    """Decode the sign of an array of unsigned values"""
+    return (values >> 1) ^ -(values & 1)
+
+
+def _decode_header_values(version, value):
+    """Same as `decoding.decode_header` but from already decoded values"""
+    if version != FORMAT_VERSION:
+        raise ValueError('Invalid format version')
+    precision = value & 15
+    value >>= 4
+    third_dim = value & 7
+    third_dim_precision = (value >> 3) & 15
+    return PolylineHeader(precision, third_dim, third_dim_precision)
+
+
+def _values_to_scaled(values):
+    """Turn the decoded unsigned values of one polyline (header included) into its header
+    and the (N, 2|3) int64 array of the coordinates multiplied by 10 ** precision"""
+    if len(values) < 2:
+        raise ValueError('Invalid encoding')
+    header = _decode_header_values(int(values[0]), int(values[1]))
+    dims = 3 if header.third_dim else 2
+
+    deltas = values[2:]
+    if len(deltas) % dims:
+        raise ValueError("Invalid encoding. Premature ending reached")
+    return header, np.cumsum(_to_signed_array(deltas).reshape(-1, dims), axis=0)
+
+
+def _values_to_coordinates(values):
+    """Turn the decoded unsigned values of one polyline (header included) into coordinates"""
+    header, scaled = _values_to_scaled(values)
+    factor_degree = 10.0 ** header.precision
+    factor_z = 10.0 ** header.third_dim_precision
+    dims = scaled.shape[1]
+
+    coordinates = scaled.astype(np.float64)
+    coordinates[:, :2] /= factor_degree
+    if dims == 3:
+        coordinates[:, 2] /= factor_z
+    return coordinates
+
+
+def _iter_decode_array(encoded):
+    """Fallback relying on the pure python decoder, for values overflowing 64 bits"""
+    dims = 3 if get_third_dimension(encoded) else 2
+    return np.array(list(iter_decode(encoded)), dtype=np.float64).reshape(-1, dims)
+
+
+def decode_array(encoded):
+    """Return the coordinates as a contiguous (N, 2) or (N, 3) float64 array depending
+    on the polyline content. The values are identical to the ones of `iter_decode`."""
+    decoded = _decode_unsigned_array(_to_bytes(encoded))
+    if decoded is None:
+        return _iter_decode_array(encoded)
+    return _values_to_coordinates(decoded[0])
+
+
+def decode_many(encoded_list):
+    """Return a list of coordinates arrays, one per polyline of `encoded_list`.
+    All the polylines are decoded in a single pass over their concatenated chars."""
+    encoded_list = list(encoded_list)
+    split = _split_values(encoded_list)
+    if split is None:
+        return [decode_array(encoded) for encoded in encoded_list]
+    return [_values_to_coordinates(values) for values in split]
+
+
+def _split_values(encoded_list):
+    """Decode the unsigned values of all the polylines of `encoded_list` in a single pass
+    and return them split per polyline. Returns None when a value overflows 64 bits."""
+    if not encoded_list:
+        return []
+
+    decoded = _decode_unsigned_array(_to_bytes(''.join(encoded_list)))
+    if decoded is None:
+        return None
+    values, ends = decoded
+
+    # every polyline must end on a complete value, locate them by char offsets
+    last_chars = np.cumsum([len(encoded) for encoded in encoded_list]) - 1
+    value_bounds = np.searchsorted(ends, last_chars)
+    found = value_bounds < len(ends)
+    if not found.all() or (ends[value_bounds] != last_chars).any():
+        raise ValueError('Invalid encoding')
+    value_bounds += 1
+
+    result = []
+    first = 0
+    for last in value_bounds:
+        result.append(values[first:last])
+        first = last
+    return result
@@ -0,0 +1,90 @@
+# Copyright (C) 2019 HERE Europe B.V.
+# Licensed under MIT, see full license in LICENSE
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+
+import numpy as np
+
+from .encoding import ABSENT, ENCODING_TABLE, encode_header
+
+__all__ = ['encode_array', 'PolylineEncoder']
+
+BYTE_ENCODING_TABLE = np.frombuffer(ENCODING_TABLE.encode('ascii'), dtype=np.uint8)
+
+
+def _scale(coordinates, dims, multiplier_degree, multiplier_z):
+    """Round an (N, dims) array of coordinates to int64 like `encode` does with `round()`"""
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    if coordinates.size == 0:
+        return np.empty((0, dims), dtype=np.int64)
+    if coordinates.ndim != 2 or coordinates.shape[1] < dims:
+        raise ValueError("coordinates must be an (N, {}) array".format(dims))
+
+    scaled = np.empty((coordinates.shape[0], dims), dtype=np.float64)
+    np.multiply(coordinates[:, :2], multiplier_degree, out=scaled[:, :2])
+    if dims == 3:
+        np.multiply(coordinates[:, 2], multiplier_z, out=scaled[:, 2])
+    # np.rint rounds half to even, same as python's round()
+    return np.rint(scaled, out=scaled).astype(np.int64)
+
+
+def _encode_signed_array(values):
+    """Zigzag + varint encode a flat int64 array. Returns the encoded ascii bytes."""
+    unsigned = ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+    n_chars = np.ones(len(unsigned), dtype=np.int64)
+    remaining = unsigned >> np.uint64(5)
+    while remaining.any():
+        n_chars += remaining > 0
+        remaining >>= np.uint64(5)
+
+    ends = np.cumsum(n_chars)
+    starts = ends - n_chars
+    buffer = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+
+    for k in range(int(n_chars.max()) if len(n_chars) else 0):
+        has_chunk = n_chars > k
+        chunk = (unsigned[has_chunk] >> np.uint64(5 * k)) & np.uint64(0x1F)
+        chunk |= np.where(n_chars[has_chunk] > k + 1, np.uint64(0x20), np.uint64(0))
+        buffer[starts[has_chunk] + k] = chunk
+
+    return BYTE_ENCODING_TABLE[buffer].tobytes()
+
+
+class PolylineEncoder(object):
+    """Incremental encoder: coordinates can be fed chunk by chunk with `add`, only the
+    encoded chars are kept. `appender` is an optional callable where the produced
+    strings will land to, otherwise they are accumulated and returned by `getvalue`."""
+
+    def __init__(self, precision=5, third_dim=ABSENT, third_dim_precision=0, appender=None):
+        self._parts = []
+        self._appender = appender if appender is not None else self._parts.append
+        self._dims = 3 if third_dim else 2
+        self._multiplier_degree = 10 ** precision
+        self._multiplier_z = 10 ** third_dim_precision
+        self._last = np.zeros(self._dims, dtype=np.int64)
+
+        header = []
+        encode_header(header.append, precision, third_dim, third_dim_precision)
+        self._appender(''.join(header))
+
+    def add(self, coordinates):
+        """Encode a chunk of lat,lng(,{third_dim}) coordinates"""
+        scaled = _scale(coordinates, self._dims, self._multiplier_degree, self._multiplier_z)
+        if not len(scaled):
+            return
+        deltas = np.diff(scaled, axis=0, prepend=self._last[np.newaxis, :])
+        self._last = scaled[-1].copy()
+        self._appender(_encode_signed_array(deltas.ravel()).decode('ascii'))
+
+    def getvalue(self):
+        """Return the polyline encoded so far, when no custom `appender` was given"""
+        return ''.join(self._parts)
+
+
+def encode_array(coordinates, precision=5, third_dim=ABSENT, third_dim_precision=0):
+    """Encode an (N, 2) or (N, 3) array of lat,lng(,{third_dim}) coordinates.
+    The output is identical to `encode` but computed with whole array operations."""
+    encoder = PolylineEncoder(precision, third_dim, third_dim_precision)
+    encoder.add(coordinates)
+    return encoder.getvalue()
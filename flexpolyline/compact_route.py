@@ -0,0 +1,171 @@
+# Copyright (C) 2019 HERE Europe B.V.
+# Licensed under MIT, see full license in LICENSE
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+
+from collections.abc import Sequence
+
+import numpy as np
+
+from .array_decoding import _split_values, _values_to_scaled
+from .array_encoding import _encode_signed_array, _scale
+from .decoding import PolylineHeader
+from .encoding import ABSENT, encode_header
+
+__all__ = ['CompactRoute']
+
+INT32 = np.iinfo(np.int32)
+
+
+class CompactRoute(Sequence):
+    """Read-only route stored like the polyline itself: the header and one packed
+    (N, 2|3) array of the coordinates scaled by 10 ** precision, int32 whenever it fits.
+    It behaves as a sequence of lat,lng(,z) float tuples so it can replace the lists
+    returned by `decode`, and `np.asarray(route)` gives the float64 coordinates.
+    A writeable `scaled` array is copied unless `copy` is False, so the caller's
+    array is never frozen nor shared."""
+
+    __slots__ = ('header', 'scaled')
+
+    def __init__(self, scaled, header, copy=True):
+        scaled = np.asarray(scaled)
+        dims = 3 if header.third_dim else 2
+        if scaled.ndim != 2 or scaled.shape[1] != dims:
+            raise ValueError("scaled must be an (N, {}) array".format(dims))
+        # int32 holds any latitude/longitude up to precision 7 (180 * 10 ** 7 < 2 ** 31)
+        if scaled.dtype != np.int32 and (
+                not scaled.size or INT32.min <= scaled.min() and scaled.max() <= INT32.max):
+            scaled = scaled.astype(np.int32)
+        elif copy and scaled.flags.writeable:
+            scaled = scaled.copy()
+        scaled.flags.writeable = False
+        self.header = header
+        self.scaled = scaled
+
+    @classmethod
+    def from_encoded(cls, encoded):
+        """Route of one encoded polyline"""
+        return cls.from_polylines([encoded])
+
+    @classmethod
+    def from_polylines(cls, encoded_list):
+        """One route made of the consecutive polylines of `encoded_list`, e.g. the
+        sections of a HERE route. They are decoded in a single pass. Sections with
+        different headers are rescaled to the finest precision, and keep their third
+        dimension only when they all have the same one. Values overflowing 64 bits
+        (far outside any coordinate) raise ValueError."""
+        encoded_list = list(encoded_list)
+        if not encoded_list:
+            return cls.empty()
+        split = _split_values(encoded_list)
+        if split is None:
+            raise ValueError('Scaled coordinates overflow 64 bits')
+        parts = [_values_to_scaled(values) for values in split]
+
+        headers = {header for header, _ in parts}
+        if len(headers) == 1:
+            header = parts[0][0]
+            if len(parts) == 1:
+                return cls(parts[0][1], header, copy=False)
+            return cls(np.concatenate([scaled for _, scaled in parts]), header, copy=False)
+
+        third_dims = {h.third_dim for h in headers}
+        third_dim = third_dims.pop() if len(third_dims) == 1 else ABSENT
+        header = PolylineHeader(
+            max(h.precision for h in headers),
+            third_dim,
+            max(h.third_dim_precision for h in headers) if third_dim else 0,
+        )
+        rescaled = []
+        for h, scaled in parts:
+            columns = [scaled[:, :2] * 10 ** (header.precision - h.precision)]
+            if third_dim:
+                columns.append(scaled[:, 2:] * 10 ** (header.third_dim_precision - h.third_dim_precision))
+            rescaled.append(np.hstack(columns))
+        return cls(np.concatenate(rescaled), header, copy=False)
+
+    @classmethod
+    def from_coordinates(cls, coordinates, precision=5, third_dim=ABSENT, third_dim_precision=0):
+        """Route of an (N, 2|3) array of coordinates, rounded like `encode` does"""
+        header = PolylineHeader(precision, third_dim, third_dim_precision)
+        dims = 3 if third_dim else 2
+        return cls(_scale(coordinates, dims, 10 ** precision, 10 ** third_dim_precision), header, copy=False)
+
+    @classmethod
+    def empty(cls, precision=5):
+        return cls(np.empty((0, 2), dtype=np.int32), PolylineHeader(precision, ABSENT, 0), copy=False)
+
+    @property
+    def dims(self):
+        return self.scaled.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.scaled.nbytes
+
+    def __len__(self):
+        return len(self.scaled)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # a view on the same packed array
+            return CompactRoute(self.scaled[index], self.header)
+        return tuple(self._unscale(self.scaled[index][np.newaxis, :])[0].tolist())
+
+    def __iter__(self):
+        # converted by blocks: bounded temporary memory on long routes
+        for start in range(0, len(self.scaled), 4096):
+            for point in self._unscale(self.scaled[start:start + 4096]).tolist():
+                yield tuple(point)
+
+    def __array__(self, dtype=None, copy=None):
+        coordinates = self._unscale(self.scaled)
+        return coordinates if dtype is None else coordinates.astype(dtype, copy=False)
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactRoute):
+            return NotImplemented
+        return self.header == other.header and np.array_equal(self.scaled, other.scaled)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'CompactRoute({} points, precision={})'.format(len(self), self.header.precision)
+
+    def to_array(self):
+        """The (N, 2|3) float64 coordinates, identical to `decode_array`"""
+        return self._unscale(self.scaled)
+
+    def lat_lng(self):
+        """Zero-copy (N, 2) view of the scaled lat,lng columns"""
+        return self.scaled[:, :2]
+
+    def lng_lat(self):
+        """Zero-copy (N, 2) view of the scaled lng,lat columns, the order map layers use"""
+        return self.scaled[:, 1::-1]
+
+    def bbox(self):
+        """(min_lat, min_lng, max_lat, max_lng) in degrees, None when empty"""
+        if not len(self.scaled):
+            return None
+        factor = 10.0 ** self.header.precision
+        low = self.scaled[:, :2].min(axis=0) / factor
+        high = self.scaled[:, :2].max(axis=0) / factor
+        return float(low[0]), float(low[1]), float(high[0]), float(high[1])
+
+    def encode(self):
+        """The route as a flexpolyline string, straight from the scaled integers"""
+        header = []
+        encode_header(header.append, *self.header)
+        if not len(self.scaled):
+            return ''.join(header)
+        deltas = np.diff(self.scaled.astype(np.int64), axis=0, prepend=np.zeros((1, self.dims), np.int64))
+        return ''.join(header) + _encode_signed_array(deltas.ravel()).decode('ascii')
+
+    def _unscale(self, scaled):
+        coordinates = scaled.astype(np.float64)
+        coordinates[:, :2] /= 10.0 ** self.header.precision
+        if self.dims == 3:
+            coordinates[:, 2] /= 10.0 ** self.header.third_dim_precision
+        return coordinates
+
@@ -0,0 +1,203 @@
+# geocode_cache.py
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+DEFAULT_TTL          = 30 * 24 * 3600  # seconds; addresses rarely move
+DEFAULT_NEGATIVE_TTL = 24 * 3600       # seconds; retry "no result" addresses daily
+DEFAULT_MAX_ENTRIES  = 10_000
+
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for an address: unicode-normalized, casefolded, punctuation
+    collapsed so "123 Main St.," and "123  main st" share one entry.
+    """
+    key = unicodedata.normalize("NFKC", address).casefold()
+    key = re.sub(r"[.,;]+", " ", key)
+    return re.sub(r"\s+", " ", key).strip()
+
+
+def _project(response: Dict) -> Dict:
+    """
+    New dict holding what the app reads of a HERE geocoding response: the
+    first item's position and address label, in the same layout.
+    """
+    items = [
+        {
+            "title":    item.get("title", ""),
+            "address":  {"label": (item.get("address") or {}).get("label", "")},
+            "position": {"lat": item["position"]["lat"], "lng": item["position"]["lng"]},
+        }
+        for item in (response.get("items") or [])[:1]
+        if item.get("position")
+    ]
+    return {"items": items}
+
+
+class SQLiteGeocodeBackend:
+    """Persistent geocode store in a local SQLite file."""
+
+    def __init__(self, path: str = "geocode_cache.sqlite"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode_cache ("
+            " address_key TEXT PRIMARY KEY,"
+            " response    TEXT NOT NULL,"
+            " expires_at  REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM geocode_cache WHERE address_key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, response: Dict, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?)",
+                (key, json.dumps(response), expires_at),
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM geocode_cache WHERE expires_at <= ?", (time.time(),)
+            )
+            self._conn.commit()
+
+
+class SnowflakeGeocodeBackend:
+    """Persistent geocode store in a Snowflake table (see setup.sql)."""
+
+    def __init__(self, session, table: str = "geocode_cache"):
+        self._session = session
+        self._table   = table
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        rows = self._session.sql(
+            f"SELECT response, expires_at FROM {self._table} WHERE address_key = ?",
+            params=[key],
+        ).collect()
+        if not rows:
+            return None
+        return json.loads(rows[0][0]), float(rows[0][1])
+
+    def set(self, key: str, response: Dict, expires_at: float) -> None:
+        self._session.sql(
+            f"""
+            MERGE INTO {self._table} t
+            USING (SELECT ? AS address_key, ? AS response, ? AS expires_at) s
+              ON t.address_key = s.address_key
+            WHEN MATCHED THEN UPDATE SET
+              response = s.response, expires_at = s.expires_at
+            WHEN NOT MATCHED THEN INSERT (address_key, response, expires_at)
+              VALUES (s.address_key, s.response, s.expires_at)
+            """,
+            params=[key, json.dumps(response), expires_at],
+        ).collect()
+
+    def purge_expired(self) -> None:
+        self._session.sql(
+            f"DELETE FROM {self._table} WHERE expires_at <= ?", params=[time.time()]
+        ).collect()
+
+
+class GeocodeCache:
+    """
+    In-process LRU of HERE geocoding responses, keyed by normalized address,
+    optionally backed by a persistent store (SQLite file or Snowflake table).
+    Responses without items are cached too, with `negative_ttl`. Only the
+    fields the app reads are kept, and every get() returns its own copy:
+    entries are shared by all sessions.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        backend=None,
+    ):
+        self.max_entries  = max_entries
+        self.ttl          = ttl
+        self.negative_ttl = negative_ttl
+        self.backend      = backend
+        self.hits = self.misses = self.negative_hits = self.backend_hits = 0
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, address: str) -> Optional[Dict]:
+        """Return the cached response for `address`, or None on a miss."""
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._count_hit(entry[0])
+                    return _project(entry[0])
+                del self._entries[key]
+
+        if self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and entry[1] > now:
+                with self._lock:
+                    self._store(key, entry)
+                    self.backend_hits += 1
+                    self._count_hit(entry[0])
+                return _project(entry[0])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, address: str, response: Dict) -> None:
+        key = normalize_address(address)
+        response = _project(response)
+        ttl = self.ttl if response["items"] else self.negative_ttl
+        entry = (response, time.time() + ttl)
+        with self._lock:
+            self._store(key, entry)
+        if self.backend is not None:
+            self.backend.set(key, *entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries":       len(self._entries),
+                "hits":          self.hits,
+                "misses":        self.misses,
+                "negative_hits": self.negative_hits,
+                "backend_hits":  self.backend_hits,
+            }
+
+    def _count_hit(self, response: Dict) -> None:
+        self.hits += 1
+        if not response.get("items"):
+            self.negative_hits += 1
+
+    def _store(self, key: str, entry: Tuple[Dict, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
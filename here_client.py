@@ -0,0 +1,188 @@
+# here_client.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from geocode_cache import GeocodeCache, normalize_address
+from tracing import propagate, span
+
+
+GEOCODE_BASE_URL = os.environ.get("HERE_GEOCODE_BASE_URL", "https://geocode.search.hereapi.com")
+ROUTER_BASE_URL  = os.environ.get("HERE_ROUTER_BASE_URL", "https://router.hereapi.com")
+MATRIX_BASE_URL  = os.environ.get("HERE_MATRIX_BASE_URL", "https://matrix.router.hereapi.com")
+
+# Largest matrix HERE computes synchronously with a flexible region
+MATRIX_SYNC_MAX_POINTS = 15
+# Via waypoints sent in one Routing v8 request; longer tours are split
+ROUTE_MAX_VIA          = 100
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HereClient:
+    """
+    Shared HERE REST client: one keep-alive connection pool, retries with
+    exponential backoff on 429/5xx, and concurrent batch geocoding.
+    Base URLs are injectable so a local stub server can stand in for HERE.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        geocode_base_url: str = GEOCODE_BASE_URL,
+        router_base_url: str = ROUTER_BASE_URL,
+        matrix_base_url: str = MATRIX_BASE_URL,
+        cache: Optional[GeocodeCache] = None,
+        retries: int = 3,
+        backoff_factor: float = 0.3,
+        pool_size: int = 8,
+        timeout: float = 30,
+    ):
+        self.api_key          = api_key
+        self.geocode_base_url = geocode_base_url.rstrip("/")
+        self.router_base_url  = router_base_url.rstrip("/")
+        self.matrix_base_url  = matrix_base_url.rstrip("/")
+        self.cache            = cache
+        self.timeout          = timeout
+        self.pool_size        = pool_size
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # Matrix Routing is a POST but has no side effect
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=2, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Bounded thread pool shared by every concurrent call of this client."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pool_size, thread_name_prefix="here"
+                )
+            return self._executor
+
+    def _get(self, url: str, params: Dict) -> Dict:
+        resp = self.session.get(url, params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def geocode(self, address: str) -> Dict:
+        """HERE Geocoding v1 response for `address`, served from cache when possible."""
+        with span("geocode", address_chars=len(address)) as sp:
+            if self.cache is not None:
+                cached = self.cache.get(address)
+                if cached is not None:
+                    sp.set(cache="hit")
+                    return cached
+            geo = self._get(
+                f"{self.geocode_base_url}/v1/geocode",
+                {"q": address, "apiKey": self.api_key},
+            )
+            sp.set(cache="miss", items=len(geo.get("items") or []))
+            if self.cache is not None:
+                self.cache.set(address, geo)
+            return geo
+
+    def geocode_many(
+        self, addresses: List[str], return_exceptions: bool = False
+    ) -> List[Union[Dict, Exception]]:
+        """
+        Geocode `addresses` concurrently on the client's thread pool; results
+        come back in input order and duplicate addresses are requested once.
+        With `return_exceptions`, failures are returned in place of results
+        instead of being raised.
+        """
+        futures = {}
+        for addr in addresses:
+            key = normalize_address(addr)
+            if key not in futures:
+                futures[key] = self.executor.submit(propagate(self.geocode), addr)
+
+        results: List[Union[Dict, Exception]] = []
+        for addr in addresses:
+            future = futures[normalize_address(addr)]
+            if return_exceptions:
+                exc = future.exception()
+                results.append(exc if exc is not None else future.result())
+            else:
+                results.append(future.result())
+        return results
+
+    def route(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        transport_mode: str = "car",
+        via: Sequence[Tuple[float, float]] = (),
+    ) -> Dict:
+        """
+        HERE Routing v8 response with the route polyline; every `via`
+        waypoint (at most ROUTE_MAX_VIA) is a stop starting a new section.
+        """
+        if len(via) > ROUTE_MAX_VIA:
+            raise ValueError(f"routing limited to {ROUTE_MAX_VIA} via waypoints")
+        with span("route_request", mode=transport_mode, via=len(via)):
+            return self._get(
+                f"{self.router_base_url}/v8/routes",
+                {
+                    "transportMode": transport_mode,
+                    "origin":        f"{origin[0]},{origin[1]}",
+                    "destination":   f"{destination[0]},{destination[1]}",
+                    "via":           [f"{lat},{lng}" for lat, lng in via],
+                    "return":        "polyline",
+                    "apikey":        self.api_key,
+                },
+            )
+
+    def matrix(
+        self, points: List[Tuple[float, float]], transport_mode: str = "car"
+    ) -> List[List[float]]:
+        """
+        Travel times in seconds between every pair of `points` with one
+        synchronous HERE Matrix Routing v8 call (origins = destinations).
+        """
+        if len(points) > MATRIX_SYNC_MAX_POINTS:
+            raise ValueError(
+                f"synchronous matrix limited to {MATRIX_SYNC_MAX_POINTS} points"
+            )
+        with span("matrix_request", points=len(points)):
+            resp = self.session.post(
+                f"{self.matrix_base_url}/v8/matrix",
+                params={"async": "false", "apiKey": self.api_key},
+                json={
+                    "origins":          [{"lat": lat, "lng": lng} for lat, lng in points],
+                    "transportMode":    transport_mode,
+                    "regionDefinition": {"type": "autoCircle"},
+                    "matrixAttributes": ["travelTimes"],
+                },
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+        matrix = resp.json()["matrix"]
+        n = matrix["numOrigins"]
+        times = matrix["travelTimes"]
+        return [times[i * n:(i + 1) * n] for i in range(n)]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,153 @@
+# query_pipeline.py
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from geocode_cache import normalize_address
+from tracing import propagate
+
+
+# Shared by every Streamlit session of the process
+PIPELINE_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="pipeline")
+
+
+class SpeculationStats:
+    """How often the speculative completion was used, across all sessions."""
+
+    def __init__(self):
+        self.started = self.used = self.discarded = self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "started":   self.started,
+                "used":      self.used,       # the agent gave no SQL
+                "discarded": self.discarded,  # ran for nothing
+                "cancelled": self.cancelled,  # dropped before it started
+            }
+
+
+speculation_stats = SpeculationStats()
+
+
+class QueryPipeline:
+    """
+    Concurrent pre-processing of one chat turn. On construction it starts,
+    all at once:
+      - the LLM address extraction (`extract_fn(query) -> list[str]`),
+      - the tool-using agent call (`agent_fn(query)`),
+      - geocoding of the local regex fallback addresses (`fallback_fn`),
+      - optionally, the plain completion used when the agent gives no SQL
+        (`completion_fn`), speculatively instead of after the agent.
+    Geocoding (`geocode_fn(address)`) of the extracted addresses starts as
+    soon as the extraction returns. The branch that turns out not to be
+    needed is cancelled (or its result discarded when already running).
+    Callables run on worker threads and must not touch Streamlit; they
+    record their spans into the caller's tracing turn.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        extract_fn: Callable[[str], List[str]],
+        agent_fn: Callable[[str], object],
+        geocode_fn: Callable[[str], Dict],
+        fallback_fn: Callable[[str], List[str]] = lambda q: [],
+        completion_fn: Optional[Callable[[str], object]] = None,
+        executor: ThreadPoolExecutor = PIPELINE_EXECUTOR,
+        max_addresses: int = 2,
+    ):
+        self.query         = query
+        self.max_addresses = max_addresses
+        self._executor     = executor
+        self._geocode_fn   = geocode_fn
+        self._geocodes: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self._fallback = fallback_fn(query)
+        self.agent_future   = executor.submit(propagate(agent_fn), query)
+        self.extract_future = executor.submit(propagate(extract_fn), query)
+        # the callback runs on the executor thread: keep the turn so its
+        # geocode spans are recorded
+        self.extract_future.add_done_callback(propagate(self._geocode_extracted))
+        self.completion_future: Optional[Future] = None
+        if completion_fn is not None:
+            self.completion_future = executor.submit(propagate(completion_fn), query)
+            speculation_stats.record("started")
+        # The regex fallback is local and instant: geocode its addresses
+        # speculatively so they are ready if the extraction finds nothing.
+        if len(self._fallback) <= max_addresses:
+            self._start_geocoding(self._fallback)
+
+    def _start_geocoding(self, addresses: List[str]) -> None:
+        with self._lock:
+            for addr in addresses:
+                key = normalize_address(addr)
+                if key not in self._geocodes:
+                    self._geocodes[key] = self._executor.submit(propagate(self._geocode_fn), addr)
+
+    def _geocode_extracted(self, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        addrs = future.result() or []
+        if 0 < len(addrs) <= self.max_addresses:
+            self._start_geocoding(addrs)
+
+    def addresses(self) -> List[str]:
+        """Extracted addresses, or the regex fallback when there are none."""
+        try:
+            addrs = self.extract_future.result() or []
+        except Exception:
+            addrs = []
+        return addrs or self._fallback
+
+    def geocodes(self, addresses: List[str]) -> List[Union[Dict, Exception]]:
+        """Geocoding results of `addresses`, in order; failures are returned in place."""
+        self._start_geocoding(addresses)
+        results: List[Union[Dict, Exception]] = []
+        for addr in addresses:
+            future = self._geocodes[normalize_address(addr)]
+            exc = future.exception()
+            results.append(exc if exc is not None else future.result())
+        return results
+
+    def agent_result(self):
+        """Result of `agent_fn`; geocoding branches are no longer needed."""
+        self.cancel_geocoding()
+        return self.agent_future.result()
+
+    def cancel_agent(self) -> None:
+        """The turn was answered with a map: drop the agent call."""
+        self.agent_future.cancel()
+
+    def completion_result(self):
+        """Result of the speculative `completion_fn`, or None when not started."""
+        if self.completion_future is None:
+            return None
+        speculation_stats.record("used")
+        future, self.completion_future = self.completion_future, None
+        return future.result()
+
+    def cancel_completion(self) -> None:
+        """The agent's answer is kept: drop the speculative completion."""
+        if self.completion_future is None:
+            return
+        outcome = "cancelled" if self.completion_future.cancel() else "discarded"
+        speculation_stats.record(outcome)
+        self.completion_future = None
+
+    def cancel_geocoding(self) -> None:
+        with self._lock:
+            for future in self._geocodes.values():
+                future.cancel()
+
+    def cancel(self) -> None:
+        self.extract_future.cancel()
+        self.cancel_agent()
+        self.cancel_completion()
+        self.cancel_geocoding()
@@ -0,0 +1,75 @@
+# resources.py
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Duration in seconds of every resource creation, by name
+LOAD_TIMES: Dict[str, float] = {}
+# Script run durations in seconds: the first (cold) one and the latest
+SCRIPT_RUNS: Dict[str, Optional[float]] = {"cold": None, "last": None, "count": 0}
+
+CORTEX_MODEL           = os.environ.get("CORTEX_MODEL", "claude-4-sonnet")
+SEMANTIC_MODELS        = os.environ.get("SEMANTIC_MODELS", "@pnp.etremblay.models/sales_metrics_model.yaml")
+CORTEX_SEARCH_SERVICES = os.environ.get("CORTEX_SEARCH_SERVICES", "pnp.etremblay.sales_conversation_search")
+
+
+def resource(fn: Callable[[], T]) -> Callable[[], T]:
+    """
+    Create the handle returned by `fn` once per process, on first use, and
+    share it across every session and rerun. Thread-safe, unlike a bare
+    lru_cache, so concurrent first calls from pool threads build it once.
+    `wrapper.loaded()` tells whether it was created yet.
+    """
+    lock  = threading.Lock()
+    value = []
+
+    @functools.wraps(fn)
+    def wrapper() -> T:
+        if not value:
+            with lock:
+                if not value:
+                    started = time.perf_counter()
+                    value.append(fn())
+                    LOAD_TIMES[fn.__name__] = time.perf_counter() - started
+        return value[0]
+
+    wrapper.loaded = lambda: bool(value)
+    return wrapper
+
+
+def record_script_run(seconds: float) -> None:
+    """Called at the end of every Streamlit script run."""
+    if SCRIPT_RUNS["cold"] is None:
+        SCRIPT_RUNS["cold"] = seconds
+    SCRIPT_RUNS["last"]   = seconds
+    SCRIPT_RUNS["count"] += 1
+
+
+@resource
+def snowpark_session():
+    """The Snowpark session of the app."""
+    from snowflake.snowpark.context import get_active_session
+    return get_active_session()
+
+
+@resource
+def here_api_key() -> str:
+    """HERE API key from the `here_api_key` secret (see setup.sql)."""
+    import _snowflake
+    secret = _snowflake.get_generic_secret_string("here_api_key")
+    os.environ["HERE_API_KEY"] = secret
+    return secret
+
+
+@resource
+def model_config() -> Dict[str, str]:
+    """Cortex model, semantic model file and search service used by the agent."""
+    return {
+        "model":           CORTEX_MODEL,
+        "semantic_model":  SEMANTIC_MODELS,
+        "search_service":  CORTEX_SEARCH_SERVICES,
+    }
@@ -0,0 +1,111 @@
+# route_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_TTL       = 24 * 3600         # seconds; traffic-free car routes are stable
+DEFAULT_PRECISION = 4                 # decimals, ~11 m at the equator
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024  # encoded polylines kept in memory
+
+RouteKey = Tuple[str, float, float, float, float]
+
+
+def route_key(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    transport_mode: str = "car",
+    precision: int = DEFAULT_PRECISION,
+) -> RouteKey:
+    """Quantize both ends so nearby geocodes of the same address share a route."""
+    return (
+        transport_mode,
+        round(origin[0], precision),
+        round(origin[1], precision),
+        round(destination[0], precision),
+        round(destination[1], precision),
+    )
+
+
+def route_polylines(here_json: Dict) -> List[str]:
+    """Encoded flexpolylines of every routes→sections of a HERE Routing v8 response."""
+    return [
+        section["polyline"]
+        for route in here_json.get("routes", [])
+        for section in route.get("sections", [])
+        if section.get("polyline")
+    ]
+
+
+class RouteCache:
+    """
+    In-process LRU of routes keyed by quantized origin/destination and
+    transport mode. Only the compact encoded polylines are stored, callers
+    decode them when the map is drawn. Bounded by TTL and total bytes.
+    """
+
+    def __init__(
+        self,
+        precision: int = DEFAULT_PRECISION,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.precision = precision
+        self.ttl       = ttl
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[RouteKey, Tuple[List[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, origin, destination, transport_mode: str = "car") -> RouteKey:
+        return route_key(origin, destination, transport_mode, self.precision)
+
+    def get(self, origin, destination, transport_mode: str = "car") -> Optional[List[str]]:
+        """Return the cached encoded polylines, or None on a miss."""
+        key = self.key(origin, destination, transport_mode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._pop(key)
+            self.misses += 1
+            return None
+
+    def set(self, origin, destination, polylines: List[str], transport_mode: str = "car") -> None:
+        # "no route" is not pinned for the TTL: the next call asks HERE again
+        if not polylines:
+            return
+        key = self.key(origin, destination, transport_mode)
+        size = sum(len(p) for p in polylines)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (list(polylines), time.time() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes":   self._bytes,
+                "hits":    self.hits,
+                "misses":  self.misses,
+            }
+
+    def _pop(self, key: RouteKey) -> None:
+        polylines, _ = self._entries.pop(key)
+        self._bytes -= sum(len(p) for p in polylines)
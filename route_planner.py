@@ -0,0 +1,143 @@
+# route_planner.py
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+# Local travel-time estimate used when no HERE matrix is available
+DEFAULT_SPEED_KMH   = 40.0   # urban delivery average
+DEFAULT_DETOUR      = 1.3    # road distance / great-circle distance
+MAX_TWO_OPT_PASSES  = 50
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distances in km, broadcasting degree arrays like numpy ufuncs."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(points: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km between every pair of (N, 2) lat/lon points."""
+    lat = points[:, 0][:, np.newaxis]
+    lon = points[:, 1][:, np.newaxis]
+    return haversine_km(lat, lon, lat.T, lon.T)
+
+
+def estimate_travel_times(
+    points: np.ndarray,
+    speed_kmh: float = DEFAULT_SPEED_KMH,
+    detour: float = DEFAULT_DETOUR,
+) -> np.ndarray:
+    """Travel-time matrix in seconds from straight-line distances."""
+    return haversine_matrix(points) * detour / speed_kmh * 3600.0
+
+
+def fill_travel_times(matrix, points: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Travel-time `matrix` (e.g. from HERE, where unreachable pairs are null)
+    with its non-finite entries replaced by the local estimate; None when a
+    stop reaches no other one, the whole matrix is then better estimated.
+    """
+    matrix = np.array(matrix, dtype=np.float64)
+    missing = ~np.isfinite(matrix)
+    if not missing.any():
+        return matrix
+    off_diagonal = ~np.eye(len(matrix), dtype=bool)
+    if len(matrix) > 1 and (missing | ~off_diagonal).all(axis=1).any():
+        return None
+    matrix[missing] = estimate_travel_times(np.asarray(points, dtype=np.float64))[missing]
+    return matrix
+
+
+def nearest_neighbour(matrix: np.ndarray, start: int = 0) -> np.ndarray:
+    """Greedy visiting order: always go to the closest stop not yet visited."""
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=np.int64)
+    current = start
+    for k in range(n):
+        order[k] = current
+        visited[current] = True
+        if k == n - 1:
+            break
+        costs = np.where(visited, np.inf, matrix[current])
+        current = int(costs.argmin())
+    return order
+
+
+def two_opt(order: np.ndarray, matrix: np.ndarray, return_to_start: bool = False,
+            max_passes: int = MAX_TWO_OPT_PASSES) -> np.ndarray:
+    """
+    Improve a visiting order with 2-opt moves (segment reversals). The first
+    stop stays first; the tour ends on it again when `return_to_start`.
+    Uses the symmetrized matrix, the delta of every move of a given first
+    edge is evaluated at once.
+    """
+    n = len(order)
+    if n < 4:
+        return order
+
+    # An open path is closed on a dummy stop at zero cost from/to everything
+    dist = np.zeros((n + 1, n + 1), dtype=np.float64)
+    dist[:n, :n] = (matrix + matrix.T) / 2
+    tour = np.append(order, order[0] if return_to_start else n)
+    m = len(tour)
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, m - 2):
+            a, b = tour[i - 1], tour[i]
+            js = np.arange(i + 1, m - 1)
+            c, e = tour[js], tour[js + 1]
+            delta = dist[a, c] + dist[b, e] - dist[a, b] - dist[c, e]
+            best = int(delta.argmin())
+            if delta[best] < -1e-9:
+                j = js[best]
+                tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return tour[:n]
+
+
+def tour_cost(order: np.ndarray, matrix: np.ndarray, return_to_start: bool = False) -> float:
+    """Total cost of visiting `order` with the (possibly asymmetric) `matrix`."""
+    cost = float(matrix[order[:-1], order[1:]].sum())
+    if return_to_start and len(order) > 1:
+        cost += float(matrix[order[-1], order[0]])
+    return cost
+
+
+def solve_tour(
+    matrix: np.ndarray, start: int = 0, return_to_start: bool = False
+) -> Tuple[np.ndarray, float]:
+    """Visiting order (nearest neighbour + 2-opt) starting at `start`, and its cost."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if len(matrix) == 0:
+        return np.empty(0, dtype=np.int64), 0.0
+    order = two_opt(nearest_neighbour(matrix, start), matrix, return_to_start)
+    return order, tour_cost(order, matrix, return_to_start)
+
+
+def leg_pairs(order: np.ndarray, return_to_start: bool = False) -> list:
+    """Consecutive (from, to) stop indices of a tour."""
+    stops = list(order) + ([order[0]] if return_to_start and len(order) > 1 else [])
+    return list(zip(stops[:-1], stops[1:]))
+
+
+def plan_order(
+    points: np.ndarray,
+    matrix: Optional[np.ndarray] = None,
+    start: int = 0,
+    return_to_start: bool = False,
+) -> Tuple[np.ndarray, float]:
+    """Order (N, 2) lat/lon stops, with a travel-time `matrix` or a local estimate."""
+    points = np.asarray(points, dtype=np.float64)
+    if matrix is None:
+        matrix = estimate_travel_times(points)
+    return solve_tour(matrix, start, return_to_start)
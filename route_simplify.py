@@ -0,0 +1,180 @@
+# route_simplify.py
+import math
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Screen tolerance in pixels; below one pixel a removed vertex is invisible
+DEFAULT_TOLERANCE_PX = 1.0
+# Zoom levels of the pre-built pyramid, coarse to fine
+PYRAMID_ZOOMS   = (4, 7, 10, 13, 16)
+PYRAMID_CACHE_SIZE = 32
+
+
+def degrees_per_pixel(zoom: float, latitude: float = 0.0) -> float:
+    """Size of one screen pixel in degrees of latitude at a web-mercator `zoom`."""
+    return 360.0 / (256.0 * 2.0 ** zoom) * math.cos(math.radians(latitude))
+
+
+def fit_zoom(coords: np.ndarray, width_px: int = 700, height_px: int = 500) -> float:
+    """Largest web-mercator zoom showing the whole (N, 2) lat/lon array."""
+    lat_min, lon_min = coords[:, :2].min(axis=0)
+    lat_max, lon_max = coords[:, :2].max(axis=0)
+    lat_span = max(lat_max - lat_min, 1e-6) / math.cos(math.radians((lat_min + lat_max) / 2))
+    lon_span = max(lon_max - lon_min, 1e-6)
+    zoom_lon = math.log2(360.0 * width_px / (256.0 * lon_span))
+    zoom_lat = math.log2(360.0 * height_px / (256.0 * lat_span))
+    return max(0.0, min(zoom_lon, zoom_lat, 18.0))
+
+
+def dp_significance(coords: np.ndarray, min_tolerance: float = 0.0) -> np.ndarray:
+    """
+    Douglas-Peucker on an (N, 2+) lat/lon array, recording for every vertex
+    the largest tolerance at which it is still kept (inf for both ends, 0 for
+    vertices dropped at `min_tolerance`). `coords[sig > tol]` is then the
+    DP simplification at `tol`, and levels are nested by construction.
+    Longitudes are scaled by cos(latitude) so tolerances are isotropic.
+    """
+    n = len(coords)
+    significance = np.zeros(n, dtype=np.float64)
+    if n == 0:
+        return significance
+    significance[0] = significance[-1] = np.inf
+    if n < 3:
+        return significance
+
+    lat = coords[:, 0]
+    x = coords[:, 1] * math.cos(math.radians(float(lat.mean())))
+    y = lat
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        norm = math.hypot(dx, dy)
+        if norm == 0.0:
+            dist = np.hypot(px, py)
+        else:
+            dist = np.abs(px * dy - py * dx) / norm
+        idx = int(dist.argmax())
+        d = float(dist[idx])
+        if d <= min_tolerance:
+            continue
+        split = first + 1 + idx
+        # a child never outlives its parent, which keeps levels nested
+        significance[split] = min(d, parent)
+        stack.append((first, split, significance[split]))
+        stack.append((split, last, significance[split]))
+    return significance
+
+
+def simplify(coords: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification of an (N, 2+) lat/lon array at `tolerance` degrees."""
+    coords = np.asarray(coords, dtype=np.float64)
+    return coords[dp_significance(coords, tolerance) > tolerance]
+
+
+class RoutePyramid:
+    """
+    Levels of detail of one route: one DP pass records every vertex's
+    significance, then each level is a boolean mask over the same array.
+    The pass only goes as deep as the finest level requested so far, so a
+    long route shown zoomed out never pays for its street-level detail.
+    """
+
+    __slots__ = (
+        "coords", "significance", "zooms", "latitude", "tolerance_px", "bounds", "_depth", "_levels", "_lock",
+    )
+
+    def __init__(
+        self,
+        coords: np.ndarray,
+        zooms: Sequence[int] = PYRAMID_ZOOMS,
+        tolerance_px: float = DEFAULT_TOLERANCE_PX,
+    ):
+        self.coords       = np.asarray(coords, dtype=np.float64)
+        self.zooms        = tuple(sorted(zooms))
+        self.tolerance_px = tolerance_px
+        self.latitude     = float(self.coords[:, 0].mean()) if len(self.coords) else 0.0
+        # (2, 2) lat/lon corners, enough for fit_zoom()
+        self.bounds       = np.array([self.coords[:, :2].min(axis=0), self.coords[:, :2].max(axis=0)])
+        self.significance = None
+        self._depth       = np.inf
+        self._levels      = {}
+        self._lock        = threading.Lock()  # shared by the sessions drawing the route
+
+    def tolerance(self, zoom: float) -> float:
+        return self.tolerance_px * degrees_per_pixel(zoom, self.latitude)
+
+    def _mask(self, zoom: int) -> np.ndarray:
+        tolerance = self.tolerance(zoom)
+        with self._lock:
+            if tolerance < self._depth:
+                self.significance = dp_significance(self.coords, tolerance)
+                self._depth = tolerance
+            return self.significance > tolerance
+
+    def level(self, zoom: float) -> np.ndarray:
+        """Simplified route for `zoom`, using the closest pyramid level at least as fine."""
+        level_zoom = next((z for z in self.zooms if z >= zoom), self.zooms[-1])
+        level = self._levels.get(level_zoom)
+        if level is None:
+            # a deeper pass later leaves coarser levels unchanged
+            level = self._levels[level_zoom] = self.coords[self._mask(level_zoom)]
+        return level
+
+    def sizes(self) -> Tuple[int, ...]:
+        """Number of vertices of every level (builds the finest one)."""
+        return tuple(int(self._mask(z).sum()) for z in reversed(self.zooms))[::-1]
+
+
+# Shared by every session thread, like the other module caches
+_pyramids: "OrderedDict[Tuple[Hashable, float], RoutePyramid]" = OrderedDict()
+_pyramids_lock = threading.Lock()
+
+
+def route_pyramid(
+    coords, tolerance_px: float = DEFAULT_TOLERANCE_PX, key: Optional[Hashable] = None
+) -> RoutePyramid:
+    """
+    RoutePyramid of the lat/lon of an (N, 2+) route, memoized across reruns
+    on `key`, e.g. its encoded polyline: a hit never touches `coords`.
+    Without a key the route is hashed, O(N) on every call.
+    """
+    if key is None:
+        coords = np.ascontiguousarray(np.asarray(coords, dtype=np.float64)[:, :2])
+        key = ("content", hash(coords.tobytes()))
+    key = (key, tolerance_px)
+    with _pyramids_lock:
+        pyramid = _pyramids.get(key)
+        if pyramid is not None:
+            _pyramids.move_to_end(key)
+            return pyramid
+    pyramid = RoutePyramid(np.asarray(coords, dtype=np.float64)[:, :2], tolerance_px=tolerance_px)
+    with _pyramids_lock:
+        # another session may have built it meanwhile: keep a single one
+        pyramid = _pyramids.setdefault(key, pyramid)
+        _pyramids.move_to_end(key)
+        while len(_pyramids) > PYRAMID_CACHE_SIZE:
+            _pyramids.popitem(last=False)
+    return pyramid
+
+
+def path_layer_data(coords, tolerance_px: float = DEFAULT_TOLERANCE_PX, key: Optional[Hashable] = None):
+    """
+    pydeck PathLayer payload for an (N, 2+) lat/lon route: the level of
+    detail visible once the view is fitted on it, as [{"path": [[lon, lat], …]}],
+    converted to lists once at the end. Returns (data, zoom, center, n_points).
+    `key` identifies the route for the pyramid cache (see route_pyramid()).
+    """
+    pyramid = route_pyramid(coords, tolerance_px, key)
+    zoom    = fit_zoom(pyramid.bounds)
+    points  = pyramid.level(zoom)
+    center  = pyramid.bounds.mean(axis=0)
+    return [{"path": points[:, ::-1].tolist()}], zoom, (float(center[0]), float(center[1])), len(points)
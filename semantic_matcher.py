@@ -0,0 +1,368 @@
+# semantic_matcher.py
+import logging
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# The semantic model deployed with the app, the one the agent's
+# cortex_analyst_text_to_sql tool reads from the stage
+SEMANTIC_MODEL_FILE = os.environ.get(
+    "SEMANTIC_MODEL_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_metrics_model.yaml"),
+)
+MAX_VALUES_PER_COLUMN = 1000  # distinct values indexed per text dimension
+
+AGGREGATIONS = {
+    "total": "SUM", "sum": "SUM", "overall": "SUM",
+    "average": "AVG", "avg": "AVG", "mean": "AVG",
+    "maximum": "MAX", "max": "MAX", "highest": "MAX", "largest": "MAX", "biggest": "MAX",
+    "minimum": "MIN", "min": "MIN", "lowest": "MIN", "smallest": "MIN",
+    "count": "COUNT", "number": "COUNT", "many": "COUNT",
+}
+AGGREGATION_LABELS = {"SUM": "Total", "AVG": "Average", "MAX": "Highest", "MIN": "Lowest", "COUNT": "Number of"}
+GROUP_WORDS  = {"by", "per", "each", "every", "across"}
+# "which rep has the highest deal value": the single top group
+PICK_WORDS   = {"which", "who"}
+# Rows of the table; "how many deals" counts them
+ENTITY_WORDS = {"deal", "deals", "sale", "sales", "opportunity", "opportunities", "transaction", "transactions"}
+FILLER_WORDS = {
+    "what", "whats", "which", "who", "how", "is", "are", "was", "were", "the", "a", "an", "of",
+    "for", "in", "on", "to", "from", "with", "and", "me", "us", "show", "list", "give", "get",
+    "tell", "all", "our", "my", "do", "does", "did", "we", "have", "has", "please", "value",
+    "values", "amount", "breakdown", "split", "grouped", "where",
+}
+TIME_GRAINS = {
+    "day": "DAY", "week": "WEEK", "month": "MONTH", "quarter": "QUARTER", "year": "YEAR",
+    "daily": "DAY", "weekly": "WEEK", "monthly": "MONTH", "quarterly": "QUARTER",
+    "yearly": "YEAR", "annual": "YEAR",
+}
+TEXT_TYPES = ("VARCHAR", "TEXT", "STRING", "CHAR")
+
+_YEAR = re.compile(r"(?:19|20)\d\d")
+
+
+def _stem(token: str) -> str:
+    """Crude singular form, applied alike to the model and the questions."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKC", text).casefold().replace("'", "").replace("_", " ")
+    return [_stem(t) for t in re.findall(r"\w+", text)]
+
+
+def _stems(words) -> Set[str]:
+    return {_stem(w) for w in words}
+
+
+_AGGREGATIONS = {_stem(w): agg for w, agg in AGGREGATIONS.items()}
+_GROUP_WORDS  = _stems(GROUP_WORDS)
+_PICK_WORDS   = _stems(PICK_WORDS)
+_ENTITY_WORDS = _stems(ENTITY_WORDS)
+_FILLER_WORDS = _stems(FILLER_WORDS)
+_TIME_GRAINS  = {_stem(w): grain for w, grain in TIME_GRAINS.items()}
+# Plain grain nouns only group after "by"/"per": "deals per month"
+_GRAIN_NOUNS  = _stems(("day", "week", "month", "quarter", "year"))
+_RESERVED     = set(_AGGREGATIONS) | _GROUP_WORDS | _ENTITY_WORDS | _FILLER_WORDS | set(_TIME_GRAINS)
+
+
+@dataclass(frozen=True)
+class Column:
+    name:      str
+    expr:      str
+    data_type: str
+    kind:      str      # "dimension", "time_dimension" or "measure"
+    default_aggregation: str = "SUM"
+
+    @property
+    def label(self) -> str:
+        return self.name.lower().replace("_", " ")
+
+    @property
+    def is_boolean(self) -> bool:
+        return self.data_type.upper().startswith("BOOLEAN")
+
+    @property
+    def is_text(self) -> bool:
+        return self.data_type.upper().startswith(TEXT_TYPES)
+
+
+@dataclass(frozen=True)
+class TemplateQuery:
+    """SQL of a matched question, with its `?` parameters."""
+    sql:    str
+    params: Tuple
+    title:  str
+
+
+class SemanticMatcher:
+    """
+    Maps simple metrics questions ("total deal value by sales rep",
+    "how many deals per month in 2024", "average deal value for Sarah
+    Johnson") straight to SQL over the table of a semantic model.
+    Column names, synonyms and dimension values are compiled into a hash
+    map of token n-grams, matched longest first. A question matches only
+    when every token is explained by the model or a known query word, so
+    anything else (negations, comparisons, free text) goes to the agent.
+    """
+
+    def __init__(self, model: dict):
+        if len(model.get("tables") or ()) != 1:
+            raise ValueError("the fast path supports semantic models with one table")
+        table = model["tables"][0]
+        base = table["base_table"]
+        self.table = ".".join(base[k] for k in ("database", "schema", "table") if base.get(k))
+        self.columns: Dict[str, Column] = {}
+        # token n-gram -> targets: ("column", name) or ("value", name, value)
+        self._phrases: Dict[Tuple[str, ...], Set[Tuple]] = {}
+        self._max_len = 1
+        for kind in ("dimensions", "time_dimensions", "measures"):
+            for spec in table.get(kind) or ():
+                column = Column(
+                    name=spec["name"],
+                    expr=spec.get("expr") or spec["name"],
+                    data_type=str(spec.get("data_type", "")),
+                    kind=kind[:-1],
+                    default_aggregation=str(spec.get("default_aggregation", "sum")).upper(),
+                )
+                self.columns[column.name] = column
+                for phrase in [column.name] + list(spec.get("synonyms") or ()):
+                    self._add(phrase, ("column", column.name))
+                # "customers" for CUSTOMER_NAME
+                short = re.sub(r"_(NAME|ID)$", "", column.name, flags=re.IGNORECASE)
+                if short != column.name and tokenize(short) and not set(tokenize(short)) & _RESERVED:
+                    self._add(short, ("column", column.name))
+                if column.kind == "dimension" and column.is_text:
+                    self.add_values(column.name, spec.get("sample_values") or ())
+        times = [c for c in self.columns.values() if c.kind == "time_dimension"]
+        self.time_column: Optional[Column] = times[0] if len(times) == 1 else None
+
+    @classmethod
+    def from_file(cls, path: str = SEMANTIC_MODEL_FILE) -> "SemanticMatcher":
+        import yaml
+
+        with open(path, encoding="utf-8") as f:
+            return cls(yaml.safe_load(f))
+
+    def add_values(self, column: str, values: Sequence) -> None:
+        """Index values of a text dimension, e.g. every sales rep, as filters."""
+        for value in values:
+            value = str(value)
+            tokens = tokenize(value)
+            # a value spelled like a query word ("Total") would shadow it
+            if tokens and not (len(tokens) == 1 and tokens[0] in _RESERVED):
+                self._add(value, ("value", column, value))
+
+    def load_values(self, session, limit: int = MAX_VALUES_PER_COLUMN) -> int:
+        """Index the distinct values of every text dimension, in one query."""
+        text = [c for c in self.columns.values() if c.kind == "dimension" and c.is_text]
+        if not text:
+            return 0
+        sql = " UNION ALL ".join(
+            f"SELECT '{c.name}', v::VARCHAR FROM "
+            f"(SELECT DISTINCT {c.expr} AS v FROM {self.table} WHERE {c.expr} IS NOT NULL LIMIT {int(limit)})"
+            for c in text
+        )
+        rows = session.sql(sql).collect()
+        by_column: Dict[str, List[str]] = {}
+        for name, value in rows:
+            by_column.setdefault(name, []).append(value)
+        for name, values in by_column.items():
+            self.add_values(name, values)
+        return len(rows)
+
+    def match(self, question: str) -> Optional[TemplateQuery]:
+        """Templated SQL answering `question`, or None to let the agent answer."""
+        tokens = tokenize(question)
+        measure: Optional[Column] = None
+        aggregation: Optional[str] = None
+        groups: List[Tuple[str, str]] = []           # (expr, alias)
+        mentioned: List[str] = []                    # dimensions named without "by"
+        values: Dict[str, List[str]] = {}
+        flags: List[str] = []                        # boolean dimensions that must be true
+        year: Optional[int] = None
+        limit: Optional[int] = None
+        grouping = recognized = False
+
+        i = 0
+        while i < len(tokens):
+            targets, size = self._longest(tokens, i)
+            if targets is not None:
+                if len(targets) > 1:
+                    return None                      # e.g. "closed": a stage or the win flag
+                target = next(iter(targets))
+                recognized = True
+                if target[0] == "value":
+                    values.setdefault(target[1], [])
+                    if target[2] not in values[target[1]]:
+                        values[target[1]].append(target[2])
+                else:
+                    column = self.columns[target[1]]
+                    if column.kind == "measure":
+                        if measure is not None and measure != column:
+                            return None
+                        measure = column
+                    elif grouping:
+                        groups.append((column.expr, column.name))
+                    elif column.is_boolean:
+                        flags.append(column.expr)
+                    else:
+                        mentioned.append(column.name)
+                grouping = False
+                i += size
+                continue
+
+            token = tokens[i]
+            if token in _AGGREGATIONS:
+                if aggregation not in (None, _AGGREGATIONS[token]):
+                    return None
+                aggregation = _AGGREGATIONS[token]
+            elif token in _GROUP_WORDS:
+                grouping = True
+            elif token == "top":
+                limit = 1
+                if i + 1 < len(tokens) and tokens[i + 1].isdigit():
+                    limit = int(tokens[i + 1])
+                    i += 1
+            elif _YEAR.fullmatch(token) and self.time_column is not None and year is None:
+                year = int(token)
+            elif token in _TIME_GRAINS and self.time_column is not None and (grouping or token not in _GRAIN_NOUNS):
+                grain = _TIME_GRAINS[token]
+                groups.append((f"DATE_TRUNC('{grain}', {self.time_column.expr})", grain))
+                grouping = False
+            elif token in _ENTITY_WORDS:
+                if grouping:
+                    return None                      # "deal value per deal": not a group
+                recognized = True
+            elif token not in _FILLER_WORDS:
+                return None
+            i += 1
+
+        if not recognized or grouping:
+            return None                              # nothing after "by"/"per": it would be dropped
+        if measure is None:
+            if aggregation != "COUNT":
+                return None
+            metric, metric_name = "COUNT(*)", "RECORD_COUNT"
+        else:
+            if aggregation == "COUNT":
+                return None
+            aggregation = aggregation or measure.default_aggregation
+            metric, metric_name = f"{aggregation}({measure.expr})", f"{aggregation}_{measure.name}"
+
+        # a dimension named next to its value filters ("sales rep Sarah
+        # Johnson"), otherwise it is grouped ("deal value per sales rep")
+        for name in mentioned:
+            if name in values:
+                continue
+            if aggregation == "COUNT":
+                return None                          # "how many customers": distinct count, not a group
+            column = self.columns[name]
+            groups.append((column.expr, column.name))
+        groups = list(dict.fromkeys(groups))
+        if aggregation in ("MAX", "MIN") and _PICK_WORDS & set(tokens):
+            if not groups:
+                return None                          # "who has the lowest deal value": a name is asked
+            limit = limit or 1
+
+        where, params = [], []
+        for name, vals in values.items():
+            expr = self.columns[name].expr
+            if len(vals) == 1:
+                where.append(f"{expr} = ?")
+            else:
+                where.append(f"{expr} IN ({', '.join('?' * len(vals))})")
+            params += vals
+        where += [f"{expr} = TRUE" for expr in dict.fromkeys(flags)]
+        if year is not None:
+            where.append(f"YEAR({self.time_column.expr}) = ?")
+            params.append(year)
+
+        sql = "SELECT " + ", ".join([f"{expr} AS {alias}" for expr, alias in groups] + [f"{metric} AS {metric_name}"])
+        sql += f" FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if groups:
+            sql += " GROUP BY " + ", ".join(str(n + 1) for n in range(len(groups)))
+            by_time = all(expr.startswith("DATE_TRUNC") for expr, _ in groups)
+            if by_time and limit is None:
+                sql += " ORDER BY 1"
+            else:
+                sql += f" ORDER BY {metric_name} {'ASC' if aggregation == 'MIN' else 'DESC'}"
+        if limit is not None:
+            sql += f" LIMIT {limit}"
+
+        title = f"{AGGREGATION_LABELS[aggregation]} {measure.label if measure else 'deals'}"
+        if groups:
+            title += " by " + ", ".join(alias.lower().replace("_", " ") for _, alias in groups)
+        filters = [v for vals in values.values() for v in vals] + ([str(year)] if year else [])
+        if filters:
+            title += " for " + ", ".join(filters)
+        return TemplateQuery(sql, tuple(params), title)
+
+    def _add(self, phrase: str, target: Tuple) -> None:
+        key = tuple(tokenize(phrase))
+        if key:
+            self._phrases.setdefault(key, set()).add(target)
+            self._max_len = max(self._max_len, len(key))
+
+    def _longest(self, tokens: List[str], start: int) -> Tuple[Optional[Set[Tuple]], int]:
+        for size in range(min(self._max_len, len(tokens) - start), 0, -1):
+            targets = self._phrases.get(tuple(tokens[start:start + size]))
+            if targets is not None:
+                return targets, size
+        return None, 0
+
+
+class FastPathStats:
+    """Hit rate of the fast path and agent time it saved, across all sessions."""
+
+    def __init__(self):
+        self.hits = self.misses = self.agent_runs = 0
+        self.fast_seconds = self.agent_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_hit(self, seconds: float) -> None:
+        with self._lock:
+            self.hits += 1
+            self.fast_seconds += seconds
+        stats = self.stats()
+        logger.info(
+            "semantic fast path hit in %.2fs: %d/%d questions (%.0f%%), ~%.0fs of agent time saved",
+            seconds, stats["hits"], stats["questions"], 100 * stats["hit_rate"], stats["saved_s"],
+        )
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def record_agent(self, seconds: float) -> None:
+        """Time the agent took to answer a question with SQL, the baseline of the savings."""
+        with self._lock:
+            self.agent_runs += 1
+            self.agent_seconds += seconds
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            questions = self.hits + self.misses
+            saved = 0.0
+            if self.hits and self.agent_runs:
+                per_question = self.agent_seconds / self.agent_runs - self.fast_seconds / self.hits
+                saved = max(per_question, 0.0) * self.hits
+            return {
+                "hits":      self.hits,
+                "questions": questions,
+                "hit_rate":  self.hits / questions if questions else 0.0,
+                "saved_s":   saved,
+            }
+
+
+fast_path_stats = FastPathStats()
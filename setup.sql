@@ -298,6 +298,109 @@ FROM TABLE(GENERATOR(ROWCOUNT => 100));
 
 ALTER TABLE emails_webinar_202508 SET CHANGE_TRACKING = TRUE;
 
+-- Reviewer decision recorded by bin_request_retrieval.mark_requests()
+ALTER TABLE emails_webinar_202508 ADD COLUMN IF NOT EXISTS decision   VARCHAR;        -- APPROVED / REJECTED
+ALTER TABLE emails_webinar_202508 ADD COLUMN IF NOT EXISTS decided_at TIMESTAMP_NTZ;
+
+-- Optional persistent cache of HERE geocoding responses (geocode_cache.py)
+CREATE TABLE IF NOT EXISTS geocode_cache (
+    address_key VARCHAR PRIMARY KEY,   -- normalized address
+    response    VARCHAR,               -- raw HERE JSON response
+    expires_at  FLOAT                  -- epoch seconds
+);
+
+-- Materialized Cortex extraction of bin requests (bin_request_retrieval.py):
+-- the append-only stream feeds each new email to COMPLETE exactly once.
+CREATE TABLE IF NOT EXISTS bin_request_extractions (
+    message_id       VARCHAR PRIMARY KEY,
+    email_id         NUMBER,
+    received_at      TIMESTAMP_NTZ,
+    json_output      VARCHAR,
+    container_format VARCHAR,
+    quantity         VARCHAR,
+    date_needed      VARCHAR,
+    requester        VARCHAR,
+    site_address     VARCHAR,
+    extracted_at     TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+);
+ALTER TABLE bin_request_extractions ADD COLUMN IF NOT EXISTS site_address VARCHAR;
+
+-- One-off backfill of the rows extracted before site_address existed (NULL;
+-- the MERGE stores '' when there is none): the stream never delivers those
+-- emails again. Same COMPLETE extraction as EXTRACTION_SQL, limited to the
+-- requests still waiting for review; a no-op once they are filled.
+UPDATE bin_request_extractions x
+SET site_address = s.site_address
+FROM (
+  SELECT
+    e.message_id,
+    COALESCE(TRY_PARSE_JSON(
+      COALESCE(TRY_PARSE_JSON(SNOWFLAKE.CORTEX.COMPLETE(
+        'claude-4-sonnet',
+        [
+          {'role':'system',
+           'content': $$Extract a JSON object with exactly these keys:
+             "container_format","quantity","date_needed","requester","site_address".
+             Output only the JSON object (no markdown).$$},
+          {'role':'user', 'content': e.body}
+        ],
+        {}
+      )):choices[0]:messages::STRING, '')
+    ):site_address::STRING, '') AS site_address
+  FROM emails_webinar_202508 e
+  JOIN bin_request_extractions b
+    ON b.message_id = e.message_id
+  WHERE b.site_address IS NULL
+    AND e.is_read = FALSE
+) s
+WHERE x.message_id = s.message_id;
+
+CREATE STREAM IF NOT EXISTS emails_webinar_202508_stream
+  ON TABLE emails_webinar_202508
+  APPEND_ONLY = TRUE
+  SHOW_INITIAL_ROWS = TRUE;
+
+-- Depots bin requests are assigned to (spatial_index.py, DEPOTS_TABLE in streamlit_app.py)
+CREATE TABLE IF NOT EXISTS depots (
+    depot_id VARCHAR PRIMARY KEY,
+    name     VARCHAR,
+    lat      FLOAT,
+    lng      FLOAT
+);
+
+INSERT INTO depots (depot_id, name, lat, lng)
+SELECT column1, column2, column3, column4 FROM VALUES
+  ('LAX', 'SnowBins Los Angeles',   34.0522, -118.2437),
+  ('SAN', 'SnowBins San Diego',     32.7157, -117.1611),
+  ('SFO', 'SnowBins Bay Area',      37.7749, -122.4194),
+  ('SMF', 'SnowBins Sacramento',    38.5816, -121.4944),
+  ('FAT', 'SnowBins Central Valley', 36.7378, -119.7871)
+WHERE NOT EXISTS (SELECT 1 FROM depots);
+
+-- Optional per-stage latency of chat turns (tracing.py, SPANS_TABLE in streamlit_app.py)
+CREATE TABLE IF NOT EXISTS app_spans (
+    turn_id     VARCHAR,
+    turn_ts     TIMESTAMP_NTZ,
+    label_chars NUMBER,            -- length of the user query (not the query itself)
+    span        VARCHAR,           -- stage name
+    start_ms    FLOAT,             -- offset from the start of the turn
+    duration_ms FLOAT,
+    thread      VARCHAR,
+    attrs       VARIANT            -- sizes, cache hit/miss, status, ...
+);
+-- tables created before label_chars stored the raw query in `label`
+ALTER TABLE app_spans ADD COLUMN IF NOT EXISTS label_chars NUMBER;
+
+-- p50/p95 per stage over the last week:
+-- SELECT span,
+--        COUNT(*)                                                     AS n,
+--        PERCENTILE_CONT(0.5)  WITHIN GROUP (ORDER BY duration_ms)   AS p50_ms,
+--        PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY duration_ms)   AS p95_ms
+-- FROM app_spans
+-- WHERE turn_ts >= DATEADD(day, -7, CURRENT_TIMESTAMP())
+-- GROUP BY span
+-- ORDER BY p95_ms DESC;
+
 
 -- Enable change tracking
 ALTER TABLE sales_conversations SET CHANGE_TRACKING = TRUE;
@@ -334,7 +437,7 @@ CREATE OR REPLACE PNP.ETREMBLAY.MODELSACE STAGE models
 CREATE OR REPLACE NETWORK RULE here_api_rules  
 MODE = EGRESS  
 TYPE = HOST_PORT  
-VALUE_LIST = ('router.hereapi.com','geocode.search.hereapi.com');
+VALUE_LIST = ('router.hereapi.com','geocode.search.hereapi.com','matrix.router.hereapi.com');
 
 CREATE OR REPLACE SECRET here_api_key  
 TYPE = GENERIC_STRING  
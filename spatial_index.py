@@ -0,0 +1,214 @@
+# spatial_index.py
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from route_planner import EARTH_RADIUS_KM, haversine_km
+
+
+DEFAULT_CELL_DEGREES = 0.05   # ~5.5 km of latitude per grid cell
+MIN_PENDING          = 1024   # points scanned linearly before the grid is rebuilt
+BRUTE_FORCE_MAX      = 4096   # nearest_many() computes full distance rows up to this size
+KM_PER_DEGREE        = math.pi * EARTH_RADIUS_KM / 180.0
+
+_ROW_SHIFT = 32
+
+
+class SpatialIndex:
+    """
+    Uniform lat/lon grid over named points (geocoded sites, depots, ...).
+    Points are sorted by cell key, so the cells of a bounding box are found
+    with two binary searches per grid row. Inserts are appended to a small
+    unsorted tail, scanned linearly, and merged into the grid once it grows
+    past MIN_PENDING or 1/8 of the index. Inserting a known id moves it.
+    Queries do not wrap around the antimeridian.
+    """
+
+    def __init__(self, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.unsaved = 0                            # points added or moved since save()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._coords = np.empty((1024, 2), dtype=np.float64)
+        self._keys   = np.empty(0, dtype=np.int64)  # sorted cell keys of the grid part
+        self._order  = np.empty(0, dtype=np.int64)  # rows in cell key order
+        self._stale  = np.zeros(0, dtype=bool)      # grid entries of moved rows
+        self._indexed = 0                           # rows [0, _indexed) are in the grid
+        self._moved: Dict[int, None] = {}           # grid rows moved to another cell
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, point_id: str) -> bool:
+        return point_id in self._rows
+
+    def position(self, point_id: str) -> Optional[Tuple[float, float]]:
+        row = self._rows.get(point_id)
+        return None if row is None else tuple(self._coords[row].tolist())
+
+    def insert(self, point_id: str, lat: float, lon: float) -> None:
+        self.insert_many([point_id], [(lat, lon)])
+
+    def insert_many(self, ids: Iterable[str], points) -> None:
+        """Add or move points; `points` is an (N, 2) lat/lon array-like."""
+        ids = list(ids)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        with self._lock:
+            for point_id, point in zip(ids, points):
+                row = self._rows.get(point_id)
+                if row is None:
+                    row = self._rows[point_id] = len(self._ids)
+                    self._ids.append(point_id)
+                    self._reserve(row + 1)
+                elif (self._coords[row] == point).all():
+                    continue
+                elif (
+                    row < self._indexed and row not in self._moved
+                    and self._cell_key(point) != self._cell_key(self._coords[row])
+                ):
+                    self._stale[np.flatnonzero(self._order == row)] = True
+                    self._moved[row] = None
+                self._coords[row] = point
+                self.unsaved += 1
+            pending = len(self._ids) - self._indexed + len(self._moved)
+            if pending > max(MIN_PENDING, len(self._ids) // 8):
+                self._rebuild()
+
+    def within_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[str]:
+        """Ids of the points inside the box."""
+        with self._lock:
+            rows = self._bbox_rows(min_lat, min_lon, max_lat, max_lon)
+            return [self._ids[r] for r in rows]
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[str, float]]:
+        """(id, km) of the points within `radius_km` of (lat, lon), closest first."""
+        with self._lock:
+            rows, dist = self._radius_rows(lat, lon, radius_km)
+            order = np.argsort(dist, kind="stable")
+            return [(self._ids[rows[i]], float(dist[i])) for i in order]
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[str, float]]:
+        """(id, km) of the `k` points closest to (lat, lon), closest first."""
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return []
+            k = min(k, n)
+            radius = self.cell_degrees * KM_PER_DEGREE
+            while True:
+                rows, dist = self._radius_rows(lat, lon, radius)
+                # the circle holds k points: nothing outside can be closer
+                if len(rows) >= k or radius > math.pi * EARTH_RADIUS_KM:
+                    break
+                radius *= 4
+            if len(rows) < k:
+                rows = np.arange(n)
+                dist = haversine_km(lat, lon, self._coords[:n, 0], self._coords[:n, 1])
+            best = np.argpartition(dist, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+            best = best[np.argsort(dist[best], kind="stable")]
+            return [(self._ids[rows[i]], float(dist[i])) for i in best]
+
+    def nearest_many(self, points) -> Tuple[List[Optional[str]], np.ndarray]:
+        """
+        Nearest point id and distance in km for every (lat, lon) of `points`,
+        e.g. approved requests → depots. Small indexes (depots) are solved
+        with one vectorized distance matrix per chunk of queries.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return [None] * len(points), np.full(len(points), np.inf)
+            if n > BRUTE_FORCE_MAX:
+                found = [self.nearest(lat, lon)[0] for lat, lon in points.tolist()]
+                return [f[0] for f in found], np.array([f[1] for f in found])
+            coords = self._coords[:n]
+            best = np.empty(len(points), dtype=np.int64)
+            dist = np.empty(len(points), dtype=np.float64)
+            chunk = max(1, 1_000_000 // n)
+            for start in range(0, len(points), chunk):
+                q = points[start:start + chunk]
+                d = haversine_km(q[:, :1], q[:, 1:], coords[:, 0], coords[:, 1])
+                best[start:start + chunk] = d.argmin(axis=1)
+                dist[start:start + chunk] = d[np.arange(len(q)), best[start:start + chunk]]
+            return [self._ids[i] for i in best], dist
+
+    def save(self, path: str) -> None:
+        """Write the points to an .npz file, atomically."""
+        with self._lock:
+            n = len(self._ids)
+            tmp = f"{path}.tmp.npz"
+            np.savez_compressed(
+                tmp,
+                ids=np.array(self._ids, dtype=str),
+                coords=self._coords[:n],
+                cell_degrees=self.cell_degrees,
+            )
+            os.replace(tmp, path)
+            self.unsaved = 0
+
+    @classmethod
+    def load(cls, path: str) -> "SpatialIndex":
+        with np.load(path) as data:
+            index = cls(float(data["cell_degrees"]))
+            index.insert_many(data["ids"].tolist(), data["coords"])
+        index._rebuild()
+        index.unsaved = 0
+        return index
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._coords):
+            grown = np.empty((max(size, 2 * len(self._coords)), 2), dtype=np.float64)
+            grown[:len(self._coords)] = self._coords
+            self._coords = grown
+
+    def _cell_key(self, point) -> int:
+        return int(self._cell_keys(np.asarray(point, dtype=np.float64).reshape(1, 2))[0])
+
+    def _cell_keys(self, coords: np.ndarray) -> np.ndarray:
+        cells = np.floor((coords + [90.0, 180.0]) / self.cell_degrees).astype(np.int64)
+        return (cells[:, 0] << _ROW_SHIFT) | cells[:, 1]
+
+    def _rebuild(self) -> None:
+        n = len(self._ids)
+        keys = self._cell_keys(self._coords[:n])
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+        self._stale = np.zeros(n, dtype=bool)
+        self._indexed = n
+        self._moved = {}
+
+    def _bbox_rows(self, min_lat, min_lon, max_lat, max_lon) -> np.ndarray:
+        low  = np.floor((np.array([min_lat, min_lon]) + [90.0, 180.0]) / self.cell_degrees).astype(np.int64)
+        high = np.floor((np.array([max_lat, max_lon]) + [90.0, 180.0]) / self.cell_degrees).astype(np.int64)
+        grid_rows = np.arange(low[0], high[0] + 1, dtype=np.int64) << _ROW_SHIFT
+        starts = np.searchsorted(self._keys, grid_rows | low[1], side="left")
+        ends   = np.searchsorted(self._keys, grid_rows | high[1], side="right")
+        parts = [self._order[s:e][~self._stale[s:e]] for s, e in zip(starts.tolist(), ends.tolist()) if e > s]
+        # the unsorted tail and moved points are checked one by one
+        tail = np.concatenate([
+            np.arange(self._indexed, len(self._ids), dtype=np.int64),
+            np.fromiter(self._moved, dtype=np.int64, count=len(self._moved)),
+        ])
+        candidates = np.concatenate(parts + [tail]) if parts else tail
+        coords = self._coords[candidates]
+        inside = (
+            (coords[:, 0] >= min_lat) & (coords[:, 0] <= max_lat)
+            & (coords[:, 1] >= min_lon) & (coords[:, 1] <= max_lon)
+        )
+        return candidates[inside]
+
+    def _radius_rows(self, lat, lon, radius_km) -> Tuple[np.ndarray, np.ndarray]:
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        rows = self._bbox_rows(
+            max(lat - dlat, -90.0), max(lon - dlon, -180.0),
+            min(lat + dlat, 90.0), min(lon + dlon, 180.0),
+        )
+        dist = haversine_km(lat, lon, self._coords[rows, 0], self._coords[rows, 1])
+        keep = dist <= radius_km
+        return rows[keep], dist[keep]
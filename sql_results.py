@@ -0,0 +1,206 @@
+# sql_results.py
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence
+
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_TTL       = 5 * 60   # seconds; sales_metrics is loaded in batches
+DEFAULT_MAX_ROWS  = 50_000   # rows of all cached pages kept in memory
+
+_QUOTED_OR_SPACE = re.compile(
+    r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|(?:--[^\n]*|/\*.*?\*/|\s)+", re.DOTALL
+)
+_QUOTED_OR_PAREN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[()]")
+_ORDER_BY        = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+_TRAILING_LIMIT  = re.compile(r"\s+LIMIT\s+(\d+)(?:\s+OFFSET\s+(\d+))?$", re.IGNORECASE)
+_ROW_BOUNDS      = re.compile(r"\b(?:LIMIT|OFFSET|FETCH|TOP)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Cache key and subquery form of a statement: comments and trailing
+    semicolons removed, runs of whitespace outside quoted literals and
+    identifiers collapsed to one space.
+    """
+    sql = _QUOTED_OR_SPACE.sub(lambda m: m.group(1) or " ", sql)
+    return sql.strip().rstrip(";").strip()
+
+
+def _top_level(sql: str) -> str:
+    """`sql` with quoted text and everything inside parentheses blanked, same offsets."""
+    out, depth, last = [], 0, 0
+    for m in _QUOTED_OR_PAREN.finditer(sql):
+        out.append(" " * (m.start() - last) if depth else sql[last:m.start()])
+        token = m.group()
+        if token == "(":
+            out.append(token if not depth else " ")
+            depth += 1
+        elif token == ")":
+            depth = max(depth - 1, 0)
+            out.append(token if not depth else " ")
+        else:
+            out.append(" " * len(token))
+        last = m.end()
+    out.append(" " * (len(sql) - last) if depth else sql[last:])
+    return "".join(out)
+
+
+def page_sql(sql: str, limit: int, offset: int) -> str:
+    """
+    Statement returning rows [offset, offset + limit) of normalized `sql`.
+    A top-level ORDER BY is kept in charge by appending LIMIT/OFFSET to the
+    statement itself (narrowing its own LIMIT/OFFSET if it has one): the
+    order of a subquery is not guaranteed to survive `SELECT * FROM (...)`.
+    Unordered statements are wrapped, their order is arbitrary anyway.
+    """
+    limit, offset = int(limit), int(offset)
+    top = _top_level(sql)
+    bounds = _TRAILING_LIMIT.search(top)
+    head = top[:bounds.start()] if bounds else top
+    if _ORDER_BY.search(head) and not _ROW_BOUNDS.search(head):
+        if bounds is None:
+            return f"{sql} LIMIT {limit} OFFSET {offset}"
+        rows, skip = int(bounds.group(1)), int(bounds.group(2) or 0)
+        limit = max(0, min(limit, rows - offset))
+        return f"{sql[:bounds.start()]} LIMIT {limit} OFFSET {skip + offset}"
+    return f"SELECT * FROM ({sql}) LIMIT {limit} OFFSET {offset}"
+
+
+class PageCache:
+    """
+    In-process LRU of result pages and row counts keyed by normalized SQL
+    text, shared by every session. Bounded by TTL and total cached rows.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_rows: int = DEFAULT_MAX_ROWS):
+        self.ttl      = ttl
+        self.max_rows = max_rows
+        self.hits = self.misses = 0
+        self._rows = 0
+        self._entries: "OrderedDict[Hashable, tuple[object, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        """Return the cached page (or count), or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._pop(key)
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value, rows: int = 0) -> None:
+        if rows > self.max_rows:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, rows, time.time() + self.ttl)
+            self._rows += rows
+            while self._rows > self.max_rows:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "rows":    self._rows,
+                "hits":    self.hits,
+                "misses":  self.misses,
+            }
+
+    def _pop(self, key: Hashable) -> None:
+        _, rows, _ = self._entries.pop(key)
+        self._rows -= rows
+
+
+# Lives as long as the module, i.e. across Streamlit reruns
+page_cache = PageCache()
+
+
+class SqlResult:
+    """
+    Server-side paged view of a generated query: pages are fetched with
+    LIMIT/OFFSET (see page_sql()) through Arrow batches, the row count with
+    a COUNT(*) run concurrently with the first page. Paging is stable only
+    when the query has an ORDER BY, which analyst SQL usually does. `params`
+    are bound to the `?` placeholders of `sql`.
+    """
+
+    def __init__(
+        self,
+        session,
+        sql: str,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        cache: Optional[PageCache] = page_cache,
+        params: Sequence = (),
+    ):
+        self.sql       = normalize_sql(sql)
+        self.params    = tuple(params)
+        self.page_size = page_size
+        self._session  = session
+        self._cache    = cache
+        self._count: Optional[int] = None
+        self._count_job = None
+
+    def _cached(self, key: Hashable):
+        return self._cache.get((self.sql, self.params) + key) if self._cache is not None else None
+
+    def _store(self, key: Hashable, value, rows: int = 0) -> None:
+        if self._cache is not None:
+            self._cache.set((self.sql, self.params) + key, value, rows)
+
+    def start_count(self) -> None:
+        """Submit the COUNT(*) without waiting for it, unless it is cached."""
+        if self._count is None and self._count_job is None:
+            self._count = self._cached(("count",))
+            if self._count is None:
+                self._count_job = self._session.sql(
+                    f"SELECT COUNT(*) FROM ({self.sql})", params=self._params()
+                ).collect_nowait()
+
+    def count(self) -> int:
+        """Total number of rows of the query."""
+        self.start_count()
+        if self._count is None:
+            self._count = int(self._count_job.result()[0][0])
+            self._count_job = None
+            self._store(("count",), self._count)
+        return self._count
+
+    def pages(self) -> int:
+        return max(1, math.ceil(self.count() / self.page_size))
+
+    def page(self, index: int = 0):
+        """pandas DataFrame of the rows of page `index` (0-based)."""
+        key = ("page", self.page_size, index)
+        df = self._cached(key)
+        if df is None:
+            df = self._fetch(self.page_size, index * self.page_size)
+            self._store(key, df, len(df))
+        return df
+
+    def _fetch(self, limit: int, offset: int):
+        import pandas as pd
+
+        query = self._session.sql(page_sql(self.sql, limit, offset), params=self._params())
+        batches = list(query.to_pandas_batches())
+        if not batches:
+            return pd.DataFrame(columns=[f.name for f in query.schema.fields])
+        return pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0]
+
+    def _params(self) -> Optional[list]:
+        return list(self.params) or None
@@ -0,0 +1,159 @@
+# sse_stream.py
+import codecs
+import json
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+
+def _sse_event(block: str) -> Optional[dict]:
+    """The event of the lines of one block (between blank lines), None without data."""
+    # the usual shapes, "[event: <name>\n]data: <payload>", skip the line loop
+    event, rest = None, block
+    if block.startswith("event: "):
+        nl = block.find("\n")
+        if nl > 0:
+            event, rest = block[7:nl], block[nl + 1:]
+    if rest.startswith("data: ") and "\n" not in rest:
+        data = [rest[6:]]
+    else:
+        event, data = None, []
+        for line in block.split("\n"):
+            if not line or line.startswith(":"):
+                continue
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+        if not data:
+            return None
+    raw = "\n".join(data)
+    try:
+        payload = json.loads(raw)
+    except json.JSONDecodeError:
+        payload = raw
+    return {"event": event or "message", "data": payload}
+
+
+def iter_sse_events(chunks: Iterable[Union[str, bytes]]) -> Iterator[dict]:
+    """
+    Incremental Server-Sent Events parser. `chunks` can be split anywhere
+    (lines, network reads, inside a UTF-8 character, ...); every event is
+    yielded as soon as its terminating blank line arrives, as
+    {"event": ..., "data": <decoded JSON>}. Each chunk is scanned once from
+    where the previous one stopped, and the buffer compacted once per chunk.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    cr = False      # the previous chunk ended with a CR, maybe half of a CRLF
+
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if cr or "\r" in chunk:
+            chunk = ("\r" if cr else "") + chunk
+            cr = chunk.endswith("\r")
+            chunk = (chunk[:-1] if cr else chunk).replace("\r\n", "\n").replace("\r", "\n")
+        # a blank line may start on the last char already buffered
+        start = max(len(buffer) - 1, 0)
+        buffer += chunk
+        pos = 0
+        while True:
+            end = buffer.find("\n\n", start)
+            if end < 0:
+                break
+            event = _sse_event(buffer[pos:end])
+            if event is not None:
+                yield event
+            pos = start = end + 2
+        if pos:
+            buffer = buffer[pos:]
+
+    buffer += decoder.decode(b"", final=True)
+    event = _sse_event(buffer.strip("\n"))
+    if event is not None:
+        yield event
+
+
+def iter_json_array(content: str) -> Iterator[dict]:
+    """Yield the items of a JSON array one by one, without decoding it whole."""
+    decoder = json.JSONDecoder()
+    pos = content.index("[") + 1
+    end = len(content)
+    while pos < end:
+        while pos < end and content[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= end or content[pos] == "]":
+            return
+        item, pos = decoder.raw_decode(content, pos)
+        yield item
+
+
+def iter_events(content: Union[str, Iterable[Union[str, bytes]]]) -> Iterator[dict]:
+    """
+    Events of a Cortex agent response, whatever its transport: the JSON
+    array of events returned by _snowflake.send_snow_api_request, a raw
+    `text/event-stream` body, or an iterable of streamed chunks.
+    """
+    if isinstance(content, str):
+        if content.lstrip().startswith("["):
+            return iter_json_array(content)
+        return iter_sse_events([content])
+    return iter_sse_events(content)
+
+
+class SSECollector:
+    """
+    Consume agent events once, either all at once with `collect()` or
+    token by token with `text_stream()` (e.g. for st.write_stream), while
+    accumulating text (in a list buffer), SQL and citations.
+    `time_to_first_token` is measured from construction, in seconds.
+    """
+
+    def __init__(self, events: Iterable[dict], started_at: Optional[float] = None):
+        self._events  = iter(events)
+        self._parts: List[str] = []
+        self.sql       = ""
+        self.citations: List[dict] = []
+        self.started_at          = started_at if started_at is not None else time.perf_counter()
+        self.time_to_first_token: Optional[float] = None
+        self.total_time:          Optional[float] = None
+
+    def _token(self, text: str) -> str:
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started_at
+        self._parts.append(text)
+        return text
+
+    def text_stream(self) -> Iterator[str]:
+        """Yield text tokens as the events arrive."""
+        for evt in self._events:
+            if evt.get("event") != "message.delta":
+                continue
+            for c in evt["data"]["delta"].get("content", []):
+                if c["type"] == "text":
+                    yield self._token(c["text"])
+                elif c["type"] == "tool_results":
+                    for r in c["tool_results"]["content"]:
+                        if r["type"] == "json":
+                            j = r["json"]
+                            if j.get("text"):
+                                yield self._token(j["text"])
+                            self.sql = j.get("sql", self.sql)
+                            for sr in j.get("searchResults", []):
+                                self.citations.append({
+                                    "source_id": sr.get("source_id",""),
+                                    "doc_id":    sr.get("doc_id","")
+                                })
+        self.total_time = time.perf_counter() - self.started_at
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def collect(self) -> Tuple[str, str, List[dict]]:
+        """Drain the remaining events and return (text, sql, citations)."""
+        for _ in self.text_stream():
+            pass
+        return self.text.strip(), self.sql.strip(), self.citations
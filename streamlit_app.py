@@ -1,59 +1,276 @@
+import time
+SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
 import json
 import re
-import pandas as pd
+from collections import OrderedDict
+from itertools import chain
+from typing import Optional
 import _snowflake
 
-from snowflake.snowpark.context import get_active_session
-from bin_request_retrieval import fetch_bin_requests, mark_request_read
+from bin_request_retrieval import fetch_bin_requests, mark_requests
 from call_here_api import (
-    call_routing_here_api,
     call_geocoding_here_api,
+    geocode_many,
+    get_route,
     decode_polyline,
     display_map,
+    plan_stops,
+    geocode_cache,
+    route_cache,
+    site_index,
 )
-
-session = get_active_session()
+from geocode_cache import SnowflakeGeocodeBackend, normalize_address
+from sse_stream import SSECollector, iter_events
+from sql_results import SqlResult, page_cache
+from answer_cache import AnswerCache, snowflake_data_version, snowflake_embedder
+from semantic_matcher import SEMANTIC_MODEL_FILE, SemanticMatcher, fast_path_stats
+from transcript_index import SnowflakeTranscriptSource, TranscriptIndex
+from spatial_index import SpatialIndex
+from query_pipeline import QueryPipeline, speculation_stats
+from address_detector import looks_like_address
+import resources
+from resources import model_config, resource, snowpark_session
+import tracing
+from tracing import span, traced
+
+# Process-wide handle: only the first run of the process creates the session
+session = snowpark_session()
 
 API_ENDPOINT = "/api/v2/cortex/agent:run"
 API_TIMEOUT  = 50_000  # milliseconds
 
-SEMANTIC_MODELS        = "@pnp.etremblay.models/sales_metrics_model.yaml"
-CORTEX_SEARCH_SERVICES = "pnp.etremblay.sales_conversation_search"
-CORTEX_MODEL           = "claude-4-sonnet"
+# Citation transcripts kept per Streamlit session
+TRANSCRIPT_CACHE_SIZE  = 50
+TRANSCRIPTS_SQL = """
+SELECT conversation_id, transcript_text
+FROM sales_conversations
+WHERE conversation_id IN (
+  SELECT f.value::STRING FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) f
+)
+"""
+
+# Optional persistent geocode cache shared by all sessions (see setup.sql),
+# e.g. "pnp.etremblay.geocode_cache"; None keeps the cache in-process only.
+GEOCODE_CACHE_TABLE    = None
+
+# Optional table receiving the spans of every chat turn (see setup.sql),
+# e.g. "pnp.etremblay.app_spans"; None keeps them in the debug panel only.
+SPANS_TABLE            = None
+
+
+# Start the plain completion together with the agent instead of after it
+# when the agent gives no SQL: lower latency, at the cost of a completion
+# call per turn that is discarded whenever the agent's answer is kept.
+SPECULATIVE_COMPLETION  = False
+
+# Answer cache in front of the agent; embeddings also match close
+# paraphrases at the cost of one EMBED_TEXT_768 query per cache miss.
+ANSWER_CACHE_EMBEDDINGS = False
+
+
+@resource
+def answer_cache() -> AnswerCache:
+    """Agent answers shared by all sessions, dropped when the source tables change."""
+    return AnswerCache(
+        data_version=snowflake_data_version(session),
+        embed=snowflake_embedder(session) if ANSWER_CACHE_EMBEDDINGS else None,
+    )
+
+
+# Simple metrics questions ("total deal value by sales rep") answered with
+# SQL templated from the semantic model: warehouse time only, no LLM call.
+SEMANTIC_FAST_PATH      = True
+
+
+@resource
+def semantic_matcher() -> SemanticMatcher:
+    """Semantic model compiled once per process, with the values of its text dimensions."""
+    matcher = SemanticMatcher.from_file(SEMANTIC_MODEL_FILE)
+    try:
+        matcher.load_values(session)
+    except Exception:
+        pass  # only the sample values of the YAML are known
+    return matcher
+
+
+# Keyword lookups over sales_conversations answered in-process (BM25),
+# without the agent and its search tool; synced with change tracking.
+TRANSCRIPT_LOOKUP_LIMIT = 5
+
+
+@resource
+def transcript_source() -> SnowflakeTranscriptSource:
+    """Transcript index of the process, loaded on the first lookup."""
+    source = SnowflakeTranscriptSource(session, TranscriptIndex())
+    source.load()
+    return source
+
+
+# Depots bin requests are assigned to (see setup.sql)
+DEPOTS_TABLE            = "depots"
+
+
+@resource
+def depot_index() -> SpatialIndex:
+    """Depots keyed by name, loaded once per process."""
+    index = SpatialIndex()
+    rows = session.sql(f"SELECT name, lat, lng FROM {DEPOTS_TABLE}").collect()
+    index.insert_many([r[0] for r in rows], [(r[1], r[2]) for r in rows])
+    return index
+
+
+@resource
+def telemetry_backends() -> None:
+    """Attach the optional Snowflake tables, once per process."""
+    if GEOCODE_CACHE_TABLE and geocode_cache.backend is None:
+        geocode_cache.backend = SnowflakeGeocodeBackend(session, GEOCODE_CACHE_TABLE)
+    if SPANS_TABLE:
+        tracing.add_sink(tracing.SnowflakeSpanSink(session, SPANS_TABLE))
 
 
 def process_sse_response(events):
     """Parse SSE events into (text, sql, citations)."""
-    text, sql, citations = "", "", []
-    for evt in events:
-        if evt.get("event") == "message.delta":
-            for c in evt["data"]["delta"].get("content", []):
-                if c["type"] == "text":
-                    text += c["text"]
-                elif c["type"] == "tool_results":
-                    for r in c["tool_results"]["content"]:
-                        if r["type"] == "json":
-                            j = r["json"]
-                            text += j.get("text", "")
-                            sql = j.get("sql", sql)
-                            for sr in j.get("searchResults", []):
-                                citations.append({
-                                    "source_id": sr.get("source_id",""),
-                                    "doc_id":    sr.get("doc_id","")
-                                })
-    return text.strip(), sql.strip(), citations
-
-
-def run_snowflake_query(sql):
     try:
-        return session.sql(sql.replace(";", ""))
+        return SSECollector(events).collect()
+    except json.JSONDecodeError as e:
+        st.error(f"Failed to parse response JSON: {e}")
+        return "", "", []
+
+
+def stream_answer(collector: SSECollector, placeholder) -> None:
+    """Render the assistant's tokens into `placeholder` as they arrive."""
+    with span("stream_answer") as sp:
+        try:
+            placeholder.write_stream(chain(["**Assistant:** "], collector.text_stream()))
+        except json.JSONDecodeError as e:
+            st.error(f"Failed to parse response JSON: {e}")
+        sp.set(chars=len(collector.text), ttft_ms=round((collector.time_to_first_token or 0) * 1000))
+    if collector.time_to_first_token is not None:
+        st.caption(
+            f"⏱ first token {collector.time_to_first_token * 1000:.0f} ms"
+            f" · complete {collector.total_time or 0:.1f} s"
+        )
+
+
+def run_snowflake_query(sql, params=()) -> SqlResult:
+    """Paged, cached view of the generated SQL; nothing runs until a page is read."""
+    return SqlResult(session, sql, cache=page_cache, params=params)
+
+
+def render_sql_results(sql: str, key: str, params=(), result: Optional[SqlResult] = None) -> None:
+    """
+    One page of the results of `sql` with its total row count: the page is
+    fetched while the COUNT(*) runs, and both are cached across reruns.
+    `result` reuses an SqlResult whose COUNT(*) was already submitted.
+    """
+    if result is None:
+        result = run_snowflake_query(sql, params)
+    page = int(st.session_state.get(f"page_{key}", 1)) - 1
+    with span("run_snowflake_query", sql_chars=len(sql), page=page) as sp:
+        try:
+            result.start_count()
+            df = result.page(page)
+            total, pages = result.count(), result.pages()
+        except Exception as e:
+            st.error(f"SQL error: {e}")
+            return
+        sp.set(rows=len(df), total=total)
+    st.write("### Results")
+    st.caption(f"{total:,} rows · page {page + 1}/{pages}")
+    st.dataframe(df)
+    if pages > 1:
+        st.number_input("Page", min_value=1, max_value=pages, step=1, key=f"page_{key}")
+
+
+def fetch_transcripts(doc_ids: list[str]) -> dict:
+    """
+    Transcripts of `doc_ids`, keyed by conversation_id (None if missing).
+    Only IDs not yet in the per-session LRU are loaded, all in one query.
+    """
+    cache = st.session_state.setdefault("transcripts", OrderedDict())
+    doc_ids = [d for d in dict.fromkeys(doc_ids) if d]
+    missing = [d for d in doc_ids if d not in cache]
+    if missing:
+        with span("fetch_transcripts", hits=len(doc_ids) - len(missing), misses=len(missing)) as sp:
+            try:
+                rows = session.sql(TRANSCRIPTS_SQL, params=[json.dumps(missing)]).collect()
+            except Exception as e:
+                st.error(f"SQL error: {e}")
+                rows = []
+            found = {r[0]: r[1] for r in rows}
+            for d in missing:
+                cache[d] = found.get(d)
+            sp.set(bytes=sum(len(t or "") for t in found.values()))
+
+    result = {}
+    for d in doc_ids:
+        cache.move_to_end(d)
+        result[d] = cache[d]
+    while len(cache) > TRANSCRIPT_CACHE_SIZE:
+        cache.popitem(last=False)
+    return result
+
+
+def render_transcript_lookup() -> None:
+    """Instant keyword search over the transcripts, optionally for one rep."""
+    words = st.text_input("Keywords", key="lookup_query")
+    if not words:
+        return
+    try:
+        source = transcript_source()
+        source.refresh()
     except Exception as e:
-        st.error(f"SQL error: {e}")
-        return None
+        st.error(f"Transcript index unavailable: {e}")
+        return
+    rep = st.selectbox("Sales rep", ["All reps"] + source.index.values("sales_rep"), key="lookup_rep")
+    flt = None if rep == "All reps" else {"@eq": {"sales_rep": rep}}
+    with span("transcript_lookup") as sp:
+        hits = source.index.search(words, filter=flt, limit=TRANSCRIPT_LOOKUP_LIMIT)
+        sp.set(hits=len(hits), indexed=len(source.index))
+    if not hits:
+        st.caption("No matching transcript.")
+        return
+    transcripts = fetch_transcripts([h["conversation_id"] for h in hits])
+    for h in hits:
+        with st.expander(f"{h['customer_name']} · {h['sales_rep']} · {h['deal_stage']} ({h['score']:.1f})"):
+            st.write(transcripts.get(h["conversation_id"]) or "No transcript available")
+
+
+@traced()
+def render_citations(citations: list[dict], key: str) -> None:
+    """
+    One expander per citation. A transcript is only queried when its
+    button is clicked, then shown from the session cache on reruns.
+    """
+    st.write("Citations:")
+    loaded = st.session_state.setdefault("transcripts", OrderedDict())
+    for n, c in enumerate(citations):
+        lbl = str(c.get("source_id", "source"))
+        doc_id = c.get("doc_id", "")
+        with st.expander(lbl):
+            if doc_id in loaded or st.button("📄 Load transcript", key=f"cite_{key}_{n}"):
+                txt = fetch_transcripts([doc_id]).get(doc_id) if doc_id else None
+                st.write(txt or "No transcript available")
+
+
+def _extract_addresses_request(text: str) -> list[str]:
+    """
+    LLM address extraction; raises on HTTP errors. Safe to run off the
+    script thread. The Cortex round trip is skipped when the local detector
+    sees no street number, street type or postal code in `text`.
+    """
+    with span("extract_addresses") as sp:
+        if not looks_like_address(text):
+            sp.set(skipped=True)
+            return []
+        addrs = _extract_addresses_llm(text)
+        sp.set(addresses=len(addrs))
+        return addrs
 
 
-def extract_addresses(text: str) -> list[str]:
+def _extract_addresses_llm(text: str) -> list[str]:
     prompt = (
         "Extract every full street address from this text and output only "
         "a JSON array of strings (no markdown). Example:\n"
@@ -61,7 +278,7 @@ def extract_addresses(text: str) -> list[str]:
         f"Text:\n```{text}```"
     )
     payload = {
-        "model": CORTEX_MODEL,
+        "model": model_config()["model"],
         "messages": [
             {"role":"user","content":[{"type":"text","text":prompt}]}
         ],
@@ -70,13 +287,11 @@ def extract_addresses(text: str) -> list[str]:
         "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
     )
     if resp.get("status") != 200:
-        st.error(f"Agent error: {resp.get('status')}")
-        return []
+        raise RuntimeError(f"Agent error: {resp.get('status')}")
     try:
-        events = json.loads(resp.get("content","[]"))
+        full_text, _, _ = SSECollector(iter_events(resp.get("content","[]"))).collect()
     except json.JSONDecodeError:
         return []
-    full_text, _, _ = process_sse_response(events)
     cleaned = re.sub(r"```(?:json)?","", full_text, flags=re.IGNORECASE).strip()
     m = re.search(r"\[.*\]", cleaned, flags=re.DOTALL)
     if not m:
@@ -87,62 +302,135 @@ def extract_addresses(text: str) -> list[str]:
         return []
 
 
+def extract_addresses(text: str) -> list[str]:
+    try:
+        return _extract_addresses_request(text)
+    except RuntimeError as e:
+        st.error(str(e))
+        return []
+
+
+def fallback_addresses(query: str) -> list[str]:
+    """Local fallback on "between ... and ..."."""
+    m = re.search(r"between\s+(.*?)\s+and\s+(.*)", query, flags=re.IGNORECASE)
+    if m:
+        return [m.group(1).strip(" ,."), m.group(2).strip(" ,.")]
+    return []
+
+
+def start_query_pipeline(query: str) -> QueryPipeline:
+    """Start address extraction, agent call and geocoding of a chat turn concurrently."""
+    return QueryPipeline(
+        query,
+        extract_fn=_extract_addresses_request,
+        agent_fn=agent_request,
+        geocode_fn=call_geocoding_here_api,
+        fallback_fn=fallback_addresses,
+        completion_fn=completion_request if SPECULATIVE_COMPLETION else None,
+    )
+
+
+def _first_position(geo: dict):
+    items = geo.get("items") or []
+    if not items:
+        return None, None
+    pos = items[0]["position"]
+    return pos["lat"], pos["lng"]
+
+
 def geocode_address(addr: str):
     try:
-        geo = call_geocoding_here_api(addr)
-        items = geo.get("items") or []
-        if not items:
-            return None, None
-        pos = items[0]["position"]
-        return pos["lat"], pos["lng"]
+        return _first_position(call_geocoding_here_api(addr))
     except Exception as e:
         st.error(f"Geocoding failed: {e}")
         return None, None
 
 
-def handle_address_logic(query: str, assistant_text: str) -> bool:
+def _positions(addrs: list[str], geos: list) -> list[tuple]:
+    positions = []
+    for addr, geo in zip(addrs, geos):
+        if isinstance(geo, Exception):
+            st.error(f"Geocoding failed for {addr}: {geo}")
+            positions.append((None, None))
+        else:
+            positions.append(_first_position(geo))
+    return positions
+
+
+def geocode_addresses(addrs: list[str]) -> list[tuple]:
+    """Geocode all `addrs` concurrently; (None, None) for failures."""
+    return _positions(addrs, geocode_many(addrs))
+
+
+@traced()
+def handle_address_logic(
+    query: str, assistant_text: str, pipeline: Optional[QueryPipeline] = None
+) -> bool:
     """
     1) Ask Cortex to extract addresses from the **user’s query**.
     2) Fallback on "between ... and ...".
     3) If 1 address → geocode + st.map
     4) If 2 addresses → geocode + routing + display_map
+    5) If more → multi-stop tour (plan_stops) + display_map
+    With a `pipeline`, extraction and geocoding already run concurrently
+    and their results are only awaited here.
     Returns True if we handled it here (and should skip the agent).
     """
-    addrs = extract_addresses(query)
+    if pipeline is not None:
+        if pipeline.extract_future.exception() is not None:
+            st.error(str(pipeline.extract_future.exception()))
+        addrs = pipeline.addresses()
+    else:
+        addrs = extract_addresses(query) or fallback_addresses(query)
+    tracing.event("addresses", count=len(addrs))
+
     if not addrs:
-        m = re.search(r"between\s+(.*?)\s+and\s+(.*)", query, flags=re.IGNORECASE)
-        if m:
-            addrs = [m.group(1).strip(" ,."), m.group(2).strip(" ,.")]
-    st.write("🔍 extracted addresses:", addrs)
+        # nothing to do
+        return False
+
+    # Multi-stop delivery tour, starting at the first address
+    if len(addrs) > 2:
+        plan = plan_stops(addrs)
+        if not plan.addresses:
+            st.error(f"Could not geocode the start, {addrs[0]}: no tour planned.")
+            return True
+        for addr in plan.failed:
+            st.error(f"Could not geocode {addr}; skipped.")
+        st.write(f"🚚 Visiting order ({plan.cost_seconds / 60:.0f} min est., {plan.matrix_source} matrix):")
+        st.markdown("\n".join(f"{i + 1}. {a}" for i, a in enumerate(plan.addresses)))
+        if plan.straight_legs:
+            st.warning(f"{plan.straight_legs} leg(s) could not be routed and are drawn as straight lines.")
+        display_map(decode_polyline(plan.polyline), key=plan.polyline)
+        return True
+
+    if pipeline is not None:
+        positions = _positions(addrs, pipeline.geocodes(addrs))
+    else:
+        positions = geocode_addresses(addrs)
 
     # Single-point map
     if len(addrs) == 1:
-        lat, lon = geocode_address(addrs[0])
+        lat, lon = positions[0]
         if lat is not None:
+            import pandas as pd
             st.write(f"📍 Map for: **{addrs[0]}**")
             st.map(pd.DataFrame({"lat":[lat],"lon":[lon]}))
         return True
 
     # Route between two points
-    if len(addrs) == 2:
-        lat1, lon1 = geocode_address(addrs[0])
-        lat2, lon2 = geocode_address(addrs[1])
-        if None in (lat1, lon1, lat2, lon2):
-            st.error("Could not geocode one or both addresses.")
-            return True
-        here_json = call_routing_here_api((lat1, lon1), (lat2, lon2))
-        coords    = decode_polyline(here_json)
-        display_map(coords)
+    (lat1, lon1), (lat2, lon2) = positions
+    if None in (lat1, lon1, lat2, lon2):
+        st.error("Could not geocode one or both addresses.")
         return True
-
-    # nothing to do
-    return False
+    polylines = get_route((lat1, lon1), (lat2, lon2))
+    display_map(decode_polyline(polylines), key=tuple(polylines))
+    return True
 
 
-def snowflake_api_call(prompt: str, limit: int = 5):
-    """Call Cortex with only the two supported tools."""
+def agent_request(prompt: str, limit: int = 5) -> dict:
+    """Raw Cortex agent response with the two supported tools; safe off the script thread."""
     payload = {
-        "model": CORTEX_MODEL,
+        "model": model_config()["model"],
         "messages":[{"role":"user","content":[{"type":"text","text":prompt}]}],
         "tool_choice": {"type":"auto"},
         "tools": [
@@ -150,54 +438,266 @@ def snowflake_api_call(prompt: str, limit: int = 5):
             {"tool_spec":{"type":"cortex_search","name":"search1"}},
         ],
         "tool_resources": {
-            "analyst1": {"semantic_model_file": SEMANTIC_MODELS},
+            "analyst1": {"semantic_model_file": model_config()["semantic_model"]},
             "search1": {
-                "name":        CORTEX_SEARCH_SERVICES,
+                "name":        model_config()["search_service"],
                 "max_results": limit,
                 "id_column":   "conversation_id"
             }
         }
     }
-    resp = _snowflake.send_snow_api_request(
-        "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
-    )
+    with span("agent_request") as sp:
+        resp = _snowflake.send_snow_api_request(
+            "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
+        )
+        sp.set(status=resp.get("status"), bytes=len(resp.get("content") or ""))
+        return resp
+
+
+def snowflake_api_call(prompt: str, limit: int = 5, resp: Optional[dict] = None):
+    """Call Cortex with only the two supported tools (or use an already received `resp`)."""
+    if resp is None:
+        resp = agent_request(prompt, limit)
     if resp.get("status") != 200:
         st.error(f"Agent HTTP error: {resp.get('status')}")
-        st.write("🔍 Raw agent response:", resp)
-        return []
-    try:
-        return json.loads(resp["content"])
-    except json.JSONDecodeError as e:
-        st.error(f"Failed to parse response JSON: {e}")
+        tracing.event("agent_error", status=resp.get("status"), content_chars=len(str(resp.get("content", ""))))
         return []
+    # Lazy: events are decoded one by one while they are consumed
+    return iter_events(resp["content"])
 
 
-def direct_completion(prompt: str) -> str:
-    """Fallback pure-text completion (no tools)."""
+def completion_request(prompt: str) -> dict:
+    """Raw pure-text completion response (no tools); safe off the script thread."""
     payload = {
-        "model": CORTEX_MODEL,
+        "model": model_config()["model"],
         "messages":[{"role":"user","content":[{"type":"text","text":prompt}]}]
     }
-    resp = _snowflake.send_snow_api_request(
-        "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
-    )
+    with span("direct_completion") as sp:
+        resp = _snowflake.send_snow_api_request(
+            "POST", API_ENDPOINT, {}, {}, payload, None, API_TIMEOUT
+        )
+        sp.set(status=resp.get("status"), bytes=len(resp.get("content") or ""))
+        return resp
+
+
+def direct_completion_stream(
+    prompt: str, resp: Optional[dict] = None, started: Optional[float] = None
+) -> SSECollector:
+    """
+    Fallback pure-text completion (no tools), consumed as a stream; or an
+    already received (speculative) `resp`, timed from `started`.
+    """
+    if started is None:
+        started = time.perf_counter()
+    if resp is None:
+        resp = completion_request(prompt)
     if resp.get("status") != 200:
         st.error(f"Completion HTTP error: {resp.get('status')}")
-        return ""
+        return SSECollector([], started)
+    return SSECollector(iter_events(resp["content"]), started)
+
+
+def direct_completion(prompt: str) -> str:
+    """Fallback pure-text completion (no tools)."""
     try:
-        events = json.loads(resp["content"])
+        text, _, _ = direct_completion_stream(prompt).collect()
     except json.JSONDecodeError:
         return ""
-    text = ""
-    for evt in events:
-        if evt.get("event") == "message.delta":
-            for c in evt["data"]["delta"].get("content", []):
-                if c["type"] == "text":
-                    text += c["text"]
-    return text.strip()
+    return text
+
+
+@traced()
+def review_requests(message_ids: list[str], status: str) -> bool:
+    """Record a reviewer decision, waiting for the UPDATE; False (and an error shown) if it failed."""
+    try:
+        mark_requests(message_ids, status)
+    except Exception as e:
+        st.error(f"Could not mark {len(message_ids)} request(s) {status}: {e}")
+        return False
+    return True
+
+
+@traced()
+def assign_depots(requests: list[dict]):
+    """
+    Nearest depot of every request's site, by great-circle distance: the
+    sites are geocoded (mostly from cache) and matched in one vectorized
+    pass, no routing call.
+    """
+    import pandas as pd
+    addrs = [r.get("site_address") or "" for r in requests]
+    positions = [site_index().position(normalize_address(a)) if a else None for a in addrs]
+    missing = [a for a, p in zip(addrs, positions) if a and p is None]
+    if missing:
+        found = dict(zip(missing, geocode_addresses(missing)))
+        positions = [p or found.get(a) for a, p in zip(addrs, positions)]
+    located = [i for i, p in enumerate(positions) if p and p[0] is not None]
+    depots, km = depot_index().nearest_many([positions[i] for i in located])
+    nearest = dict(zip(located, zip(depots, km.round(1).tolist())))
+    return pd.DataFrame({
+        "requester":  [r.get("requester") for r in requests],
+        "site":       addrs,
+        "depot":      [nearest.get(i, (None, None))[0] for i in range(len(requests))],
+        "km":         [nearest.get(i, (None, None))[1] for i in range(len(requests))],
+    })
+
+
+def answer_query(query: str) -> None:
+    """Answer one chat turn: a map for addresses, else the agent's answer."""
+    # 0) Same question already answered on unchanged data: no agent run
+    with span("answer_cache") as sp:
+        cached = answer_cache().get(query)
+        sp.set(cache="miss" if cached is None else "hit")
+    if cached is not None:
+        text, sql, citations = cached
+        st.markdown(f"**Assistant:** {text}")
+        st.caption("⚡ cached answer")
+        show_answer(text, sql, citations)
+        return
+
+    # 1) Simple metrics question: SQL straight from the semantic model
+    if SEMANTIC_FAST_PATH and answer_fast_path(query):
+        return
+
+    # 2) Address extraction, geocoding and the 2‑tool agent all
+    #    start at once; only the branch that is needed is awaited
+    started  = time.perf_counter()
+    pipeline = start_query_pipeline(query)
+
+    # Address/route override?
+    if handle_address_logic(query, "", pipeline):
+        # mapping has been displayed, skip the rest
+        pipeline.cancel_agent()
+        pipeline.cancel_completion()
+        return
+
+    # 3) Agent answer, streaming its tokens as they arrive
+    answer = st.empty()
+    with span("agent_wait"):
+        resp = pipeline.agent_result()
+    collector = SSECollector(snowflake_api_call(query, resp=resp) or [], started)
+    stream_answer(collector, answer)
+    text, sql, citations = collector.text.strip(), collector.sql.strip(), collector.citations
+
+    # 4) FALLBACK on plain completion *any time* there was no SQL,
+    #    streamed in place of the agent's answer
+    if not sql:
+        with span("completion_wait", speculative=pipeline.completion_future is not None):
+            resp = pipeline.completion_result()
+        if resp is not None:
+            collector = direct_completion_stream(query, resp, started)
+        else:
+            collector = direct_completion_stream(query)
+        stream_answer(collector, answer)
+        text = collector.text.strip()
+        # citations are only shown if we *didn’t* fallback
+        citations = []
+    else:
+        pipeline.cancel_completion()
+
+    # only grounded agent answers are shared: a plain-completion fallback
+    # is not served to every session asking a similar question
+    if text and sql:
+        answer_cache().set(query, (text, sql, citations))
+    show_answer(text, sql, citations)
+    if sql:
+        # baseline of the time saved by the fast path
+        fast_path_stats.record_agent(time.perf_counter() - started)
+
+
+def answer_fast_path(query: str) -> bool:
+    """
+    Answer `query` with the semantic model's templated SQL when it matches;
+    False (nothing shown) to let the agent answer it instead.
+    """
+    started = time.perf_counter()
+    with span("semantic_fast_path") as sp:
+        match = semantic_matcher().match(query)
+        sp.set(result="miss" if match is None else "hit")
+        if match is not None:
+            try:
+                # show_answer() reuses the result, its first page and
+                # pending COUNT(*); a failing query falls back to the agent
+                result = run_snowflake_query(match.sql, match.params)
+                result.start_count()
+                result.page(0)
+            except Exception as e:
+                tracing.event("semantic_fast_path_error", error=str(e))
+                match = None
+    if match is None:
+        fast_path_stats.record_miss()
+        return False
+
+    text = f"{match.title}:"
+    st.markdown(f"**Assistant:** {text}")
+    st.caption("⚡ answered from the semantic model, no LLM call")
+    show_answer(text, match.sql, [], match.params, result)
+    fast_path_stats.record_hit(time.perf_counter() - started)
+    return True
+
+
+def show_answer(
+    text: str, sql: str, citations: list[dict], params=(), result: Optional[SqlResult] = None
+) -> None:
+    """Keep the answer for replay, then show its SQL, results and citations."""
+    # 5) Keep the assistant’s answer for replay; its widgets are keyed by
+    # its index so they match the replayed ones
+    st.session_state.messages.append({
+        "role": "assistant",
+        "content": text,
+        "citations": citations,
+        "sql": sql,
+        "params": list(params),
+    })
+    key = str(len(st.session_state.messages) - 1)
+
+    # 6) If we did generate SQL, show it and the first page of its results
+    if sql:
+        st.markdown("### Generated SQL")
+        st.code(sql, language="sql")
+        render_sql_results(sql, key, params, result)
+
+    # 7) Citations of the agent's search tool
+    if citations:
+        render_citations(citations, key)
+
+
+def render_trace(t: Optional[tracing.Turn]) -> None:
+    """Waterfall of the spans of the last chat turn."""
+    if t is None:
+        st.caption("No chat turn traced yet.")
+        return
+    import pandas as pd
+    st.caption(f"Last turn: {t.duration * 1000:.0f} ms, {len(t.spans)} spans")
+    rows = pd.DataFrame(t.rows())
+    if rows.empty:
+        return
+    import altair as alt
+    chart = alt.Chart(rows).mark_bar().encode(
+        x=alt.X("start_ms:Q", title="ms"),
+        x2="end_ms:Q",
+        y=alt.Y("span:N", sort=None, title=None),
+        color=alt.Color("thread:N", legend=None),
+        tooltip=["span", "duration_ms", "thread", "attrs"],
+    )
+    st.altair_chart(chart, use_container_width=True)
+    st.dataframe(rows[["span", "start_ms", "duration_ms", "attrs"]], hide_index=True)
+
+
+def render_startup() -> None:
+    """Cost of the cold script run of this process and of the last rerun."""
+    runs = resources.SCRIPT_RUNS
+    if runs["cold"] is not None:
+        st.caption(
+            f"Script run: cold {runs['cold'] * 1000:.0f} ms"
+            f" · last rerun {runs['last'] * 1000:.0f} ms ({runs['count']} runs)"
+        )
+    if resources.LOAD_TIMES:
+        st.caption(" · ".join(f"{k} {v * 1000:.0f} ms" for k, v in resources.LOAD_TIMES.items()))
 
 
 def main():
+    telemetry_backends()
     st.title("🚚 Bin Management & Mapping Assistant")
     tab1, tab2 = st.tabs(["Review Requests","Assistant & Maps"])
 
@@ -220,7 +720,6 @@ def main():
 
             st.subheader(f"Request {idx+1}/{len(requests)}")
             st.markdown(f"> {req['raw_body']}")
-            st.write("🔍 Full request dict:", req)
 
             if "json_output" in req:
                 try:
@@ -235,82 +734,101 @@ def main():
 
             c1, c2, c3 = st.columns(3)
             if c1.button("✅ Approve", key=f"app_{mid}"):
-                mark_request_read(mid)
-                st.success("Approved")
+                if review_requests([mid], "approved"):
+                    st.success("Approved")
             if c2.button("❌ Reject", key=f"rej_{mid}"):
-                mark_request_read(mid)
-                st.warning("Rejected")
+                if review_requests([mid], "rejected"):
+                    st.warning("Rejected")
             if c3.button("➡️ Next", key=f"next_{mid}"):
                 st.session_state.req_idx += 1
 
+        # Bulk review: one set-based UPDATE for every selected request
+        if requests:
+            with st.expander(f"Bulk review ({len(requests)} visible)"):
+                labels = {
+                    r["message_id"]: f"{r['requester'] or '?'} — {r['container_format']} × {r['quantity']} ({r['date_needed']})"
+                    for r in requests
+                }
+                selected = st.multiselect(
+                    "Requests", list(labels), format_func=labels.get, key="bulk_ids"
+                )
+                b1, b2, b3 = st.columns(3)
+                if b1.button("✅ Approve selected", key="bulk_app", disabled=not selected):
+                    if review_requests(selected, "approved"):
+                        st.success(f"Approved {len(selected)} requests")
+                if b2.button("❌ Reject selected", key="bulk_rej", disabled=not selected):
+                    if review_requests(selected, "rejected"):
+                        st.warning(f"Rejected {len(selected)} requests")
+                if b3.button("✅ Approve all visible", key="bulk_app_all"):
+                    if review_requests(list(labels), "approved"):
+                        st.success(f"Approved {len(labels)} requests")
+                if st.button("🏭 Assign selected to nearest depot", key="bulk_depot", disabled=not selected):
+                    chosen = [r for r in requests if r["message_id"] in selected]
+                    try:
+                        st.dataframe(assign_depots(chosen), hide_index=True)
+                    except Exception as e:
+                        st.error(f"Depot assignment failed: {e}")
+
     # ── Tab 2: Chat + Maps
     with tab2:
         if "messages" not in st.session_state:
             st.session_state.messages = []
 
         # replay prior chat
-        for msg in st.session_state.messages:
+        for i, msg in enumerate(st.session_state.messages):
             who = "You" if msg["role"] == "user" else "Assistant"
             st.markdown(f"**{who}:** {msg['content']}")
+            if msg.get("sql"):
+                # results pages are cached: paging reruns don't re-query
+                with st.expander("Results", expanded=True):
+                    render_sql_results(msg["sql"], str(i), msg.get("params", ()))
+            if msg.get("citations"):
+                render_citations(msg["citations"], str(i))
 
         query = st.text_input("Your question:", key="chat_input")
         if st.button("Send", key="chat_send") and query:
             st.session_state.messages.append({"role": "user", "content": query})
+            with tracing.turn(query) as t:
+                answer_query(query)
+            st.session_state.last_trace = t
+
+        with st.expander("🔎 Transcript keyword lookup"):
+            render_transcript_lookup()
 
-            # 1) Address/route override?
-            if handle_address_logic(query, ""):
-                # mapping has been displayed, skip the rest
-                return
-
-            # 2) Fire the 2‑tool agent
-            events = snowflake_api_call(query)
-            text, sql, citations = process_sse_response(events or [])
-
-            # 3) FALLBACK on plain completion *any time* there was no SQL
-            did_fallback = False
-            if not sql:
-                text = direct_completion(query)
-                did_fallback = True
-
-            # 4) Show the assistant’s answer
-            if text:
-                st.session_state.messages.append({"role": "assistant", "content": text})
-                st.markdown(f"**Assistant:** {text}")
-
-            # 5) If we did generate SQL, show it and its results
-            if sql:
-                st.markdown("### Generated SQL")
-                st.code(sql, language="sql")
-                df = run_snowflake_query(sql)
-                if df is not None:
-                    st.write("### Results")
-                    st.dataframe(df)
-
-            # 6) Only show citations if we *didn’t* fallback
-            if not did_fallback and citations:
-                st.write("Citations:")
-                for c in citations:
-                    lbl = str(c.get("source_id", "source"))
-                    doc_id = c.get("doc_id", "")
-                    q_sql = (
-                        "SELECT transcript_text "
-                        "FROM sales_conversations "
-                        f"WHERE conversation_id = '{doc_id}'"
-                    )
-                    df2 = run_snowflake_query(q_sql)
-                    txt = "No transcript available"
-                    if df2 is not None:
-                        pdf = df2.to_pandas()
-                        if not pdf.empty:
-                            txt = pdf.iloc[0, 0]
-                    with st.expander(lbl):
-                        st.write(txt)         
-                        
     # ── Sidebar: reset chat
     with st.sidebar:
         if st.button("🔄 New Conversation", key="new_chat"):
             st.session_state.messages = []
             st.rerun()
+        stats = geocode_cache.stats()
+        st.caption(f"Geocode cache: {stats['hits']} hits / {stats['misses']} misses")
+        stats = route_cache.stats()
+        st.caption(f"Route cache: {stats['hits']} hits / {stats['misses']} misses")
+        stats = page_cache.stats()
+        st.caption(f"SQL page cache: {stats['hits']} hits / {stats['misses']} misses")
+        if SPECULATIVE_COMPLETION:
+            stats = speculation_stats.stats()
+            st.caption(
+                f"Speculative completion: {stats['used']} used / {stats['started']} started"
+                f" ({stats['discarded']} discarded, {stats['cancelled']} cancelled)"
+            )
+        if answer_cache.loaded():
+            stats = answer_cache().stats()
+            st.caption(
+                f"Answer cache: {stats['hits']} hits ({stats['similar_hits']} similar)"
+                f" / {stats['misses']} misses"
+            )
+        if SEMANTIC_FAST_PATH:
+            stats = fast_path_stats.stats()
+            st.caption(
+                f"Semantic fast path: {stats['hits']} / {stats['questions']} questions"
+                f" ({stats['hit_rate']:.0%}), ~{stats['saved_s']:.0f} s saved"
+            )
+        if st.checkbox("🐞 Debug timings", key="debug_timings"):
+            render_startup()
+            render_trace(st.session_state.get("last_trace"))
+
+    resources.record_script_run(time.perf_counter() - SCRIPT_STARTED)
 
 if __name__ == "__main__":
     main()
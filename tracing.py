@@ -0,0 +1,169 @@
+# tracing.py
+import contextvars
+import functools
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    """One timed stage of a chat turn; `attrs` holds sizes, cache hit/miss, ..."""
+    name:     str
+    start:    float                     # seconds since the turn started
+    duration: float = 0.0               # seconds
+    thread:   str = ""
+    attrs:    Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+
+class Turn:
+    """All spans recorded while answering one query, across threads."""
+
+    def __init__(self, label: str = ""):
+        self.id       = uuid.uuid4().hex
+        self.label    = label
+        self.started  = time.perf_counter()
+        self.wall     = time.time()
+        self.duration = 0.0
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Spans as flat rows ordered by start, e.g. for a waterfall chart."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return [
+            {
+                "span":        s.name,
+                "start_ms":    round(s.start * 1000, 1),
+                "end_ms":      round((s.start + s.duration) * 1000, 1),
+                "duration_ms": round(s.duration * 1000, 1),
+                "thread":      s.thread,
+                "attrs":       json.dumps(s.attrs, default=str),
+            }
+            for s in spans
+        ]
+
+
+_current_turn: contextvars.ContextVar[Optional[Turn]] = contextvars.ContextVar(
+    "current_turn", default=None
+)
+_sinks: List[Callable[[Turn], None]] = []
+
+
+def add_sink(sink: Callable[[Turn], None]) -> None:
+    """Register a callable receiving every finished turn (e.g. SnowflakeSpanSink)."""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+
+def current_turn() -> Optional[Turn]:
+    return _current_turn.get()
+
+
+@contextmanager
+def turn(label: str = "") -> Iterator[Turn]:
+    """Collect the spans of everything run inside this block (and its propagated threads)."""
+    t = Turn(label)
+    token = _current_turn.set(t)
+    try:
+        yield t
+    finally:
+        t.duration = time.perf_counter() - t.started
+        _current_turn.reset(token)
+        for sink in _sinks:
+            try:
+                sink(t)
+            except Exception:
+                pass
+
+
+class _NullSpan(Span):
+    def set(self, **attrs) -> None:
+        pass
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """Time a block; a no-op outside of a turn."""
+    t = _current_turn.get()
+    if t is None:
+        yield _NullSpan(name, 0.0)
+        return
+    s = Span(name, time.perf_counter() - t.started, thread=threading.current_thread().name, attrs=attrs)
+    try:
+        yield s
+    except Exception as e:
+        s.set(error=repr(e))
+        raise
+    finally:
+        s.duration = time.perf_counter() - t.started - s.start
+        t.add(s)
+
+
+def event(name: str, **attrs) -> None:
+    """Zero-length span, e.g. to record a payload that used to be printed for debugging."""
+    with span(name, **attrs):
+        pass
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator recording every call of the function as a span."""
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(fn: Callable) -> Callable:
+    """Bind `fn` to the caller's turn, to submit it to a thread pool."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+class SnowflakeSpanSink:
+    """
+    Append the spans of every finished turn to a Snowflake table (see setup.sql).
+    Only the length of the turn's label is stored: it is the user's question.
+    """
+
+    def __init__(self, session, table: str = "app_spans"):
+        self._session = session
+        self._table   = table
+
+    def __call__(self, t: Turn) -> None:
+        rows = [dict(r, turn_id=t.id, label_chars=len(t.label), turn_ts=t.wall) for r in t.rows()]
+        if not rows:
+            return
+        self._session.sql(
+            f"""
+            INSERT INTO {self._table}
+              (turn_id, turn_ts, label_chars, span, start_ms, duration_ms, thread, attrs)
+            SELECT
+              f.value:turn_id::STRING,
+              TO_TIMESTAMP_NTZ(f.value:turn_ts::FLOAT),
+              f.value:label_chars::NUMBER,
+              f.value:span::STRING,
+              f.value:start_ms::FLOAT,
+              f.value:duration_ms::FLOAT,
+              f.value:thread::STRING,
+              PARSE_JSON(f.value:attrs::STRING)
+            FROM TABLE(FLATTEN(INPUT => PARSE_JSON(?))) f
+            """,
+            params=[json.dumps(rows)],
+        ).collect_nowait()
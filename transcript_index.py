@@ -0,0 +1,422 @@
+# transcript_index.py
+import itertools
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Searchable attributes of the sales_conversation_search service (see setup.sql)
+ATTRIBUTES       = ("customer_name", "sales_rep", "deal_stage", "product_line")
+DEFAULT_K1       = 1.2
+DEFAULT_B        = 0.75
+COMPACT_MIN_DEAD = 1024   # deleted rows kept as tombstones before compacting...
+COMPACT_RATIO    = 0.25   # ...once they are also this share of the rows
+REFRESH_INTERVAL = 60     # seconds between two change-tracking checks
+UPSERT_BATCH     = 4096   # documents tokenized, then appended to the columns at once
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have in into is it its of on or our
+that the their them they this to was were will with we you your
+""".split())
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Casefolded words of `text`, stop words dropped."""
+    words = _WORD.findall(unicodedata.normalize("NFKC", text or "").casefold())
+    return [w for w in words if w not in STOPWORDS]
+
+
+class _Column:
+    """
+    numpy vector appended in place, its capacity doubled when full. Views
+    of `values` stay valid after appends: a grown column gets a new buffer.
+    """
+
+    __slots__ = ("data", "size")
+
+    def __init__(self, dtype, values=None):
+        self.data = np.empty(0, dtype=dtype) if values is None else values
+        self.size = len(self.data)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    def reserve(self, extra: int) -> None:
+        """Room for `extra` more values; raises (e.g. MemoryError) before any change."""
+        if self.size + extra > len(self.data):
+            data = np.empty(max(self.size + extra, 2 * len(self.data)), dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def extend(self, values) -> None:
+        """Append after reserve(): cannot fail."""
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+
+class TranscriptIndex:
+    """
+    In-process BM25 inverted index over transcripts with categorical
+    attributes, filtered with the Cortex Search filter syntax ("@eq",
+    "@and", "@or", "@not"). Postings are append-only int32 row / uint16 tf
+    numpy columns scored in place; replacing or deleting a document leaves
+    a tombstone, and tombstones are compacted away in bulk. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        attributes: Sequence[str] = ATTRIBUTES,
+        k1: float = DEFAULT_K1,
+        b: float = DEFAULT_B,
+        store_text: bool = False,
+    ):
+        self.attributes = tuple(attributes)
+        self.k1 = k1
+        self.b  = b
+        self.store_text = store_text
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids: List[str] = []                 # row -> document id
+            self._rows: Dict[str, int] = {}           # live document id -> row
+            self._alive   = _Column(np.bool_)
+            self._lengths = _Column(np.float32)
+            self._texts: List[Optional[str]] = []
+            self._postings: Dict[str, Tuple[_Column, _Column]] = {}  # term -> rows, tfs
+            # per attribute: value -> code, code -> value, and the code of every row (-1: none)
+            self._vocab: Dict[str, Dict[str, int]] = {a: {} for a in self.attributes}
+            self._names: Dict[str, List[str]] = {a: [] for a in self.attributes}
+            self._codes: Dict[str, _Column] = {a: _Column(np.int32) for a in self.attributes}
+            self._total_length = 0.0
+            self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def values(self, attribute: str) -> List[str]:
+        """Known values of `attribute`, for filter pickers."""
+        with self._lock:
+            return sorted(self._vocab[attribute])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            postings = sum(rows.size for rows, _ in self._postings.values())
+            return {
+                "documents":  len(self._rows),
+                "tombstones": self._dead,
+                "terms":      len(self._postings),
+                "postings":   postings,
+                # row and tf arrays, per-row lengths, flags and attribute codes
+                "array_bytes": postings * 6 + len(self._ids) * (5 + 4 * len(self.attributes)),
+            }
+
+    def upsert(self, doc_id: str, text: str, attributes: Optional[Dict[str, object]] = None) -> None:
+        self.upsert_many([(doc_id, text, attributes or {})])
+
+    def upsert_many(self, docs: Iterable[Tuple[str, str, Dict[str, object]]]) -> int:
+        """
+        Add or replace (id, text, attributes) documents; returns how many.
+        They are appended by batches, each whole or not at all: every column
+        has room for the batch before the first one is written.
+        """
+        count = 0
+        docs = iter(docs)
+        with self._lock:
+            try:
+                for batch in iter(lambda: list(itertools.islice(docs, UPSERT_BATCH)), []):
+                    self._append(batch)
+                    count += len(batch)
+            finally:
+                self._maybe_compact()
+        return count
+
+    def _append(self, docs: List[Tuple[str, str, Dict[str, object]]]) -> None:
+        first = len(self._ids)
+        counts = [Counter(tokenize(text)) for _, text, _ in docs]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        # (term, row, tf) of every posting of the batch, grouped by term
+        terms: List[str] = []
+        tfs: List[int] = []
+        for c in counts:
+            terms.extend(c.keys())
+            tfs.extend(c.values())
+        rows = np.repeat(np.arange(first, first + len(docs), dtype=np.int32), [len(c) for c in counts])
+        # ids by first occurrence: once sorted, the runs of postings follow `unique`
+        ids: Dict[str, int] = {}
+        term_ids = np.fromiter(map(ids.setdefault, terms, itertools.count()), dtype=np.int64, count=len(terms))
+        order = np.argsort(term_ids, kind="stable")
+        unique = list(ids)
+        ends = np.append(np.flatnonzero(np.diff(term_ids[order])) + 1, len(terms))
+        sizes = np.diff(ends, prepend=0).tolist()
+        ends = ends.tolist()
+        rows = rows[order]
+        tfs = np.minimum(np.array(tfs, dtype=np.int64)[order], 65535).astype(np.uint16)
+
+        new_terms = {t: (_Column(np.int32), _Column(np.uint16)) for t in unique if t not in self._postings}
+        for column in (self._alive, self._lengths, *self._codes.values()):
+            column.reserve(len(docs))
+        for term, size in zip(unique, sizes):
+            for column in self._postings.get(term) or new_terms[term]:
+                column.reserve(size)
+        codes = {
+            name: np.array([self._code(name, attributes.get(name)) for _, _, attributes in docs], dtype=np.int32)
+            for name in self.attributes
+        }
+
+        # nothing below can fail halfway
+        self._postings.update(new_terms)
+        start = 0
+        for term, end in zip(unique, ends):
+            term_rows, term_tfs = self._postings[term]
+            term_rows.extend(rows[start:end])
+            term_tfs.extend(tfs[start:end])
+            start = end
+        for name, column in self._codes.items():
+            column.extend(codes[name])
+        self._alive.extend(np.ones(len(docs), dtype=np.bool_))
+        self._lengths.extend(lengths)
+        self._total_length += float(lengths.sum(dtype=np.float64))
+        # in order: a document repeated in the batch replaces its previous row
+        for i, (doc_id, text, _) in enumerate(docs):
+            self._delete(doc_id)
+            self._ids.append(doc_id)
+            self._rows[doc_id] = first + i
+            self._texts.append(text if self.store_text else None)
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            found = self._delete(doc_id)
+            self._maybe_compact()
+            return found
+
+    def search(
+        self,
+        query: str,
+        filter: Optional[dict] = None,
+        limit: int = 10,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[dict]:
+        """
+        Best `limit` documents for `query` by BM25 score, restricted by
+        `filter`, e.g. {"@eq": {"sales_rep": "Mike Chen"}}. Rows carry the
+        id, the score, the `columns` attributes (all by default) and the
+        transcript when it is stored. An empty query lists filtered rows.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        columns = self.attributes if columns is None else tuple(columns)
+        with self._lock:
+            n, live = len(self._ids), len(self._rows)
+            if not live or limit <= 0:
+                return []
+            alive = self._alive.values
+            mask = alive if filter is None else alive & self._mask(filter)
+
+            if not terms:
+                rows = np.flatnonzero(mask)[:limit]
+                scores = np.zeros(len(rows), dtype=np.float32)
+            else:
+                scores = self._scores(terms, alive, n, live)
+                rows = np.flatnonzero((scores > 0) & mask)
+                if len(rows) > limit:
+                    rows = rows[np.argpartition(scores[rows], -limit)[-limit:]]
+                rows = rows[np.argsort(-scores[rows], kind="stable")]
+                scores = scores[rows]
+            return [self._result(int(r), float(s), columns) for r, s in zip(rows, scores)]
+
+    def _scores(self, terms: List[str], alive: np.ndarray, n: int, live: int) -> np.ndarray:
+        lengths = self._lengths.values
+        norm_scale = self.b / max(self._total_length / live, 1e-9)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            rows = postings[0].values
+            df = int(np.count_nonzero(alive[rows]))
+            if not df:
+                continue
+            idf = math.log(1.0 + (live - df + 0.5) / (df + 0.5))
+            tf = postings[1].values.astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + norm_scale * lengths[rows])
+            # a term occurs once per row: plain fancy-index add is exact
+            scores[rows] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return scores
+
+    def _mask(self, filter: dict) -> np.ndarray:
+        if len(filter) != 1:
+            raise ValueError(f"filter needs exactly one operator: {filter}")
+        (op, arg), = filter.items()
+        n = len(self._ids)
+        if op == "@eq":
+            mask = np.ones(n, dtype=bool)
+            for name, value in arg.items():
+                if name not in self._vocab:
+                    raise ValueError(f"unknown attribute: {name}")
+                code = self._vocab[name].get(str(value))
+                if code is None:
+                    return np.zeros(n, dtype=bool)
+                mask &= self._codes[name].values == code
+            return mask
+        if op == "@and":
+            return np.logical_and.reduce([self._mask(f) for f in arg] or [np.ones(n, dtype=bool)])
+        if op == "@or":
+            return np.logical_or.reduce([self._mask(f) for f in arg] or [np.zeros(n, dtype=bool)])
+        if op == "@not":
+            return ~self._mask(arg)
+        raise ValueError(f"unsupported filter operator: {op}")
+
+    def _result(self, row: int, score: float, columns: Sequence[str]) -> dict:
+        result = {"conversation_id": self._ids[row], "score": score}
+        for name in columns:
+            code = int(self._codes[name].data[row])
+            result[name] = None if code < 0 else self._names[name][code]
+        if self.store_text:
+            result["transcript_text"] = self._texts[row]
+        return result
+
+    def _code(self, name: str, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        code = self._vocab[name].get(value)
+        if code is None:
+            code = self._vocab[name][value] = len(self._names[name])
+            self._names[name].append(value)
+        return code
+
+    def _delete(self, doc_id: str) -> bool:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self._alive.data[row] = False
+        self._total_length -= float(self._lengths.data[row])
+        self._texts[row] = None
+        self._dead += 1
+        return True
+
+    def _maybe_compact(self) -> None:
+        if self._dead > max(COMPACT_MIN_DEAD, COMPACT_RATIO * len(self._ids)):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drop the tombstones of replaced and deleted documents."""
+        with self._lock:
+            keep = np.flatnonzero(self._alive.values)
+            remap = np.full(len(self._ids), -1, dtype=np.int32)
+            remap[keep] = np.arange(len(keep), dtype=np.int32)
+
+            # fancy indexing copies: the new columns own their buffers
+            postings = {}
+            for term, (rows, tfs) in self._postings.items():
+                rows = rows.values
+                kept = remap[rows] >= 0
+                if kept.any():
+                    postings[term] = (
+                        _Column(np.int32, remap[rows[kept]]),
+                        _Column(np.uint16, tfs.values[kept]),
+                    )
+            self._postings = postings
+            self._ids = [self._ids[r] for r in keep]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._texts = [self._texts[r] for r in keep]
+            self._lengths = _Column(np.float32, self._lengths.values[keep])
+            self._alive = _Column(np.bool_, np.ones(len(keep), dtype=np.bool_))
+            self._codes = {name: _Column(np.int32, codes.values[keep]) for name, codes in self._codes.items()}
+            self._dead = 0
+
+
+class SnowflakeTranscriptSource:
+    """
+    Keeps a TranscriptIndex in sync with a Snowflake table: one snapshot
+    load, then the net row changes since the last sync read with the
+    CHANGES clause (the table has CHANGE_TRACKING, see setup.sql).
+    """
+
+    def __init__(
+        self,
+        session,
+        index: TranscriptIndex,
+        table: str = "sales_conversations",
+        refresh_interval: float = REFRESH_INTERVAL,
+    ):
+        self.index = index
+        self.refresh_interval = refresh_interval
+        self._session = session
+        self._table   = table
+        self._columns = ", ".join(("conversation_id", "transcript_text") + index.attributes)
+        self._synced_at: Optional[int] = None   # epoch nanoseconds of the last sync
+        self._version  = None
+        self._checked  = 0.0
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """Index the whole table as of now."""
+        with self._lock:
+            now, version = self._now()
+            rows = self._session.sql(
+                f"SELECT {self._columns} FROM {self._table} AT(TIMESTAMP => TO_TIMESTAMP_LTZ({now}, 9))"
+            ).to_local_iterator()
+            self.index.clear()
+            count = self.index.upsert_many(self._doc(r) for r in rows)
+            self._synced_at, self._version = now, version
+            return count
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Apply the changes committed since the last sync; at most every
+        `refresh_interval` seconds unless `force`. Returns the rows applied.
+        """
+        if self._synced_at is None:
+            return self.load()
+        with self._lock:
+            if not force and time.time() - self._checked < self.refresh_interval:
+                return 0
+            self._checked = time.time()
+            now, version = self._now()
+            if version == self._version:
+                return 0
+            try:
+                changes = self._session.sql(
+                    f"SELECT {self._columns}, METADATA$ACTION FROM {self._table}"
+                    f" CHANGES(INFORMATION => DEFAULT)"
+                    f" AT(TIMESTAMP => TO_TIMESTAMP_LTZ({self._synced_at}, 9))"
+                    f" END(TIMESTAMP => TO_TIMESTAMP_LTZ({now}, 9))"
+                ).collect()
+            except Exception:
+                changes = None
+        if changes is None:
+            # e.g. the last sync is older than the change retention
+            return self.load()
+        with self._lock:
+            # an update is a DELETE of the old row and an INSERT of the new one
+            for row in changes:
+                if row[-1] == "DELETE":
+                    self.index.delete(row[0])
+            self.index.upsert_many(self._doc(r) for r in changes if r[-1] == "INSERT")
+            self._synced_at, self._version = now, version
+            return len(changes)
+
+    def _now(self) -> Tuple[int, object]:
+        row = self._session.sql(
+            f"SELECT DATE_PART(EPOCH_NANOSECOND, CURRENT_TIMESTAMP()),"
+            f" SYSTEM$LAST_CHANGE_COMMIT_TIME('{self._table}')"
+        ).collect()[0]
+        return int(row[0]), row[1]
+
+    def _doc(self, row) -> Tuple[str, str, Dict[str, object]]:
+        names = self.index.attributes
+        return row[0], row[1], {name: row[2 + i] for i, name in enumerate(names)}